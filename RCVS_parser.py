@@ -2,9 +2,9 @@ try:
     import xml.etree.cElementTree as eT
 except ImportError:
     import xml.etree.ElementTree as eT
-import unicodecsv as csv
+import csv
 from dlcs.image_collection import Image, ImageCollection
-from parser_output import Work, ParserResponse
+from parser_output import Work, ParserResponse, ImageMetadata
 from collections import OrderedDict
 import settings
 import logging
@@ -17,28 +17,39 @@ class Parser:
 
     def parse(self, original_filename, parse_file):
 
-        logging.debug("parsing " + original_filename + " as " + parse_file)
+        # parse_file is a path, a file-like object (such as an S3 StreamingBody) or an iterable of lines
+        if isinstance(parse_file, basestring):
+            logging.debug("parsing " + original_filename + " as " + parse_file)
+            with open(parse_file, 'rb') as csv_file:
+                return self.parse_lines(original_filename, csv_file)
+
+        logging.debug("parsing " + original_filename + " from stream")
+        if hasattr(parse_file, 'read'):
+            return self.parse_lines(original_filename, iter_stream_lines(parse_file))
+        return self.parse_lines(original_filename, parse_file)
+
+    def parse_lines(self, original_filename, lines):
+
         work = Work()
         toc = OrderedDict()
         flags = {}
 
-        work.id = original_filename.rsplit('.', 1)[0][4:]
+        work.id = self.get_work_id_from_filename(original_filename)
 
-        with open(parse_file, 'rb') as csv_file:
+        reader = csv.reader(lines, dialect='excel-tab', delimiter='\t')
+        layout = ColumnLayout(next(reader, []))
+        images = []
+        image_metadata = ImageMetadata()
 
-            reader = csv.DictReader(csv_file, dialect='excel-tab', delimiter='\t', encoding='utf-8-sig')
-            images = []
-            image_metadata = {}
+        if original_filename.startswith('lib'):
+            self.parse_library_data(reader, layout, work, images, image_metadata, toc, flags)
+        elif original_filename.startswith('arc'):
+            self.parse_archive_data(reader, layout, work, images, image_metadata, toc, flags)
 
-            if original_filename.startswith('lib'):
-                self.parse_library_data(reader, work, images, image_metadata, toc, flags)
-            elif original_filename.startswith('arc'):
-                self.parse_archive_data(reader, work, images, image_metadata, toc, flags)
-
-            work.image_collection = ImageCollection(images)
-            work.toc = toc
-            work.image_metadata = image_metadata
-            work.flags = flags
+        work.image_collection = ImageCollection(images)
+        work.toc = toc
+        work.image_metadata = image_metadata
+        work.flags = flags
 
         response = ParserResponse()
         response.works = [work]
@@ -46,125 +57,130 @@ class Parser:
 
         return response
 
-    def parse_archive_data(self, reader, work, images, image_metadata, toc, flags):
-
-        first = True
+    @staticmethod
+    def get_work_id_from_filename(original_filename):
+
+        return original_filename.rsplit('.', 1)[0][4:]
+
+    def parse_archive_data(self, reader, layout, work, images, image_metadata, toc, flags):
+
+        work_columns = layout.get_positions([
+            ArcCatalogueRefColumn,
+            ArcWorkTitleColumn,
+            ArcRepositoryColumn,
+            ArcCollectionColumn,
+            ArcSeriesColumn,
+            ArcSubSeriesColumn,
+            ArcCopyrightColumn,
+            ArcPermalinkColumn
+        ])
+        image_columns = layout.get_positions([
+            ArcCatalogueRefColumn,
+            ArcImageTitleColumn,
+            ArcDateColumn,
+            ArcDescriptionColumn,
+            ArcCreatorColumn,
+            ArcFormatColumn,
+            ArcCatalogueEntryURLColumn
+        ])
+        image_metadata.labels = tuple(intern(column) for column, index in image_columns)
+        filename_index = layout.positions.get(ArcFilenameColumn)
+        contents_index = layout.positions.get(LibContentsColumn)
+
+        rows = iter_data_rows(reader)
+        row = next(rows, None)
+        if row is None:
+            return
+        work.label = layout.get_required(row, ArcWorkTitleColumn)
+        work.work_metadata = get_metadata_for_positions(row, work_columns)
+        flags['Viewing_Mode'] = layout.get_required(row, ViewingModeColumn)
+
+        relative = settings.RCVS_RELATIVE
+        space = settings.CURRENT_SPACE
         image_index = 0
-        for row in reader:
-            if first:
-                work.label = row[ArcWorkTitleColumn]
-                work.work_metadata = self.get_metadata_for_cols(row,
-                                                                [
-                                                                    ArcCatalogueRefColumn,
-                                                                    ArcWorkTitleColumn,
-                                                                    ArcRepositoryColumn,
-                                                                    ArcCollectionColumn,
-                                                                    ArcSeriesColumn,
-                                                                    ArcSubSeriesColumn,
-                                                                    ArcCopyrightColumn,
-                                                                    ArcPermalinkColumn
-                                                                ])
-                viewing_mode = row[ViewingModeColumn]
-                flags['Viewing_Mode'] = viewing_mode
-                first = False
-            else:
-
-                origin = settings.RCVS_RELATIVE + row.get(ArcFilenameColumn)
-                image = Image(space=settings.CURRENT_SPACE, origin=origin, string_1=work.id, number_1=0, number_2=image_index)
-                images.append(image)
-
-                # toc
-                article_entries = map(lambda x: x.strip(), row.get(LibContentsColumn).split('|'))
-                for article in article_entries:
-                    if article not in toc:
-                        toc[article] = []
-                    toc[article].append(image_index)
-
-                image_metadata[image_index] = self.get_metadata_for_cols(row,
-                                                                         [
-                                                                             ArcCatalogueRefColumn,
-                                                                             ArcImageTitleColumn,
-                                                                             ArcDateColumn,
-                                                                             ArcDescriptionColumn,
-                                                                             ArcCreatorColumn,
-                                                                             ArcFormatColumn,
-                                                                             ArcCatalogueEntryURLColumn
-                                                                         ])
-
-                image_index += 1
-
-    def parse_library_data(self, reader, work, images, image_metadata, toc, flags):
-
-        first = True
+        for row in rows:
+            origin = relative + get_value(row, filename_index)
+            images.append(Image(space=space, origin=origin, string_1=work.id, number_1=0, number_2=image_index))
+
+            # toc
+            if contents_index is not None:
+                for article in get_value(row, contents_index, '').split('|'):
+                    article = article.strip()
+                    entries = toc.get(article)
+                    if entries is None:
+                        entries = toc[article] = []
+                    entries.append(image_index)
+
+            image_metadata.append(get_values_for_positions(row, image_columns))
+            image_index += 1
+
+    def parse_library_data(self, reader, layout, work, images, image_metadata, toc, flags):
+
+        work_columns = layout.get_positions([
+            LibWorkTitleColumn,
+            LibRepositoryColumn,
+            LibCollectionColumn,
+            LibVolumeColumn,
+            LibChapterColumn,
+            LibIssueColumn,
+            LibDateColumn,
+            LibPublicationInfoColumn,
+            LibMaterialTypeColumn,
+            LibGeneralNoteColumn,
+            LibLanguageColumn,
+            LibCopyrightColumn,
+            LibPermalinkColumn
+        ])
+        image_columns = layout.get_positions([
+            LibPageColumn,
+            LibArticleColumn,
+            LibAuthorColumn,
+            LibSubjectColumn,
+            LibCatalogueEntryURLColumn
+        ])
+        image_metadata.labels = tuple(intern(column) for column, index in image_columns)
+        filename_index = layout.positions.get(LibFilenameColumn)
+        contents_index = layout.positions.get(LibContentsColumn)
+
+        rows = iter_data_rows(reader)
+        row = next(rows, None)
+        if row is None:
+            return
+        work.label = layout.get_required(row, LibWorkTitleColumn)
+        work.work_metadata = get_metadata_for_positions(row, work_columns)
+        flags['Viewing_Mode'] = layout.get_required(row, ViewingModeColumn)
+        flags['Canvas_Label_Field'] = 'Page'
+
+        relative = settings.RCVS_RELATIVE
+        space = settings.CURRENT_SPACE
         image_index = 0
-        for row in reader:
-            if first:
-                work.label = row[LibWorkTitleColumn]
-                work.work_metadata = self.get_metadata_for_cols(row,
-                                                                [
-                                                                    LibWorkTitleColumn,
-                                                                    LibRepositoryColumn,
-                                                                    LibCollectionColumn,
-                                                                    LibVolumeColumn,
-                                                                    LibChapterColumn,
-                                                                    LibIssueColumn,
-                                                                    LibDateColumn,
-                                                                    LibPublicationInfoColumn,
-                                                                    LibMaterialTypeColumn,
-                                                                    LibGeneralNoteColumn,
-                                                                    LibLanguageColumn,
-                                                                    LibCopyrightColumn,
-                                                                    LibPermalinkColumn
-                                                                ])
-                viewing_mode = row[ViewingModeColumn]
-                flags['Viewing_Mode'] = viewing_mode
-                flags['Canvas_Label_Field'] = 'Page'
-                first = False
-            else:
-
-                # images
-                origin = settings.RCVS_RELATIVE + row.get(LibFilenameColumn)
-                image = Image(space=settings.CURRENT_SPACE, origin=origin, string_1=work.id, number_1=0, number_2=image_index)
-                images.append(image)
-
-                # toc
-                article_entries = map(lambda x: x.strip(), row.get(LibContentsColumn, '').split('|'))
-                for article in article_entries:
-                    if article is not None and len(article) > 0:
-                        if article not in toc:
-                            toc[article] = []
-                        toc[article].append(image_index)
-
-                # metadata
-                image_metadata[image_index] = self.get_metadata_for_cols(row,
-                                                                         [
-                                                                             LibPageColumn,
-                                                                             LibArticleColumn,
-                                                                             LibAuthorColumn,
-                                                                             LibSubjectColumn,
-                                                                             LibCatalogueEntryURLColumn
-                                                                         ])
-                image_index += 1
-
-    @staticmethod
-    def get_metadata_for_cols(row, cols):
-
-        meta = []
-
-        for column in cols:
-            value = row.get(column)
-            if value is not None and len(value) > 0:
-                meta.append({'label': column, 'value': value})
-
-        return meta
+        for row in rows:
+
+            # images
+            origin = relative + get_value(row, filename_index)
+            images.append(Image(space=space, origin=origin, string_1=work.id, number_1=0, number_2=image_index))
+
+            # toc
+            if contents_index is not None:
+                for article in get_value(row, contents_index, '').split('|'):
+                    article = article.strip()
+                    if len(article) > 0:
+                        entries = toc.get(article)
+                        if entries is None:
+                            entries = toc[article] = []
+                        entries.append(image_index)
+
+            # metadata
+            image_metadata.append(get_values_for_positions(row, image_columns))
+            image_index += 1
 
     def get_manifest_path_from_reference(self, reference):
 
-        return 'http://dlcs.io/iiif-resource/50/waylon-rcdd/' + reference + '/0'
+        return settings.DLCS_RESOURCE_ENTRY + 'iiif-resource/50/waylon-rcdd/' + reference + '/0'
 
     def get_images_for_work_path(self, reference):
 
-        return 'http://dlcs.io/raw-resource/50/waylon-rcdd/' + reference + '/0'
+        return settings.DLCS_RESOURCE_ENTRY + 'raw-resource/50/waylon-rcdd/' + reference + '/0'
 
     def custom_decoration(self, data, manifest):
 
@@ -178,6 +194,84 @@ class Parser:
 
         manifest['attribution'] = "<a href='http://www.rcvsvethistory.org/'>RCVS Vet History</a> brought to you by RCVS Knowledge"
 
+class ColumnLayout(object):
+
+    # column positions resolved once from the header row, so data rows can be read as plain lists
+
+    def __init__(self, header):
+
+        self.positions = {}
+        for index, name in enumerate(header):
+            if index == 0:
+                name = name.decode('utf-8-sig')
+            else:
+                name = name.decode('utf-8')
+            # as with a DictReader, the last of any duplicated column names wins
+            self.positions[name] = index
+
+    def get_positions(self, columns):
+
+        return [(column, self.positions[column]) for column in columns if column in self.positions]
+
+    def get_required(self, row, column):
+
+        return get_value(row, self.positions[column])
+
+
+def iter_data_rows(reader):
+
+    for row in reader:
+        # blank lines are skipped, as they were by DictReader
+        if len(row) > 0:
+            yield row
+
+
+def get_value(row, index, default=None):
+
+    if index is None or index >= len(row):
+        return default
+    return row[index].decode('utf-8')
+
+
+def get_metadata_for_positions(row, positions):
+
+    meta = []
+    row_length = len(row)
+    for column, index in positions:
+        if index < row_length:
+            value = row[index]
+            if len(value) > 0:
+                meta.append({'label': column, 'value': value.decode('utf-8')})
+    return meta
+
+
+def get_values_for_positions(row, positions):
+
+    # raw utf-8 values, decoded only when the metadata is serialised
+    row_length = len(row)
+    return [row[index] if index < row_length and len(row[index]) > 0 else None for column, index in positions]
+
+
+def iter_stream_lines(stream, chunk_size=64 * 1024):
+
+    # yields complete lines (including line endings) as the chunks arrive
+    remainder = ''
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        lines = (remainder + chunk).splitlines(True)
+        remainder = ''
+        if not lines[-1].endswith(('\n', '\r')):
+            remainder = lines.pop()
+        elif lines[-1].endswith('\r'):
+            # the matching \n may arrive at the start of the next chunk
+            remainder = lines.pop()
+        for line in lines:
+            yield line
+    if remainder:
+        yield remainder
+
 # --Column Mappings-- #
 
 LibContentsColumn = 'Contents'
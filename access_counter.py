@@ -0,0 +1,46 @@
+import logging
+import threading
+import time
+
+
+class AccessCounter(object):
+
+    # counts requests per work in memory and adds them to the metadata index every flush_seconds, so the counts
+    # outlive the process and are shared by every worker on the host
+
+    def __init__(self, index, flush_seconds):
+
+        self.index = index
+        self.flush_seconds = flush_seconds
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.last_flush = time.time()
+
+    def record(self, work_id):
+
+        now = time.time()
+        with self.lock:
+            self.counts[work_id] = self.counts.get(work_id, 0) + 1
+            if now - self.last_flush < self.flush_seconds:
+                return
+            counts = self.counts
+            self.counts = {}
+            self.last_flush = now
+        self.write(counts, now)
+
+    def flush(self):
+
+        with self.lock:
+            counts = self.counts
+            self.counts = {}
+            self.last_flush = time.time()
+        self.write(counts, self.last_flush)
+
+    def write(self, counts, now):
+
+        if len(counts) == 0:
+            return
+        try:
+            self.index.record_accesses(counts, now)
+        except Exception:
+            logging.exception("Could not record accesses for %d works" % (len(counts),))
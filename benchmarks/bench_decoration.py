@@ -0,0 +1,50 @@
+# Times manifest decoration stages on synthetic DLCS manifests, e.g.
+#
+#   python benchmarks/bench_decoration.py --canvases 50 500 5000
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import synthetic
+from manifest_decoration import WorkIndex, decorate_manifest, load_manifest
+
+MANIFEST_URL = 'http://localhost/work/0001.manifest'
+
+
+def time_call(function, repeat):
+
+    return min(timeit.repeat(function, number=1, repeat=repeat)) * 1000
+
+
+def main():
+
+    arg_parser = argparse.ArgumentParser(description='Benchmark manifest decoration')
+    arg_parser.add_argument('--canvases', type=int, nargs='+', default=[50, 500, 5000])
+    arg_parser.add_argument('--repeat', type=int, default=20)
+    args = arg_parser.parse_args()
+
+    print '%8s %10s %10s %10s %10s %10s %12s' % ('canvases', 'parse ms', 'index ms', 'decorate ms', 'dump ms',
+                                                  'total ms', 'canvases/s')
+    for canvases in args.canvases:
+        manifest_string = json.dumps(synthetic.get_dlcs_manifest('0001', canvases))
+        data = synthetic.get_work_data(canvases)
+        work_index = WorkIndex(data)
+        manifest = load_manifest(manifest_string)
+
+        parse_ms = time_call(lambda: load_manifest(manifest_string), args.repeat)
+        index_ms = time_call(lambda: WorkIndex(data), args.repeat)
+        decorate_ms = time_call(lambda: decorate_manifest(work_index, manifest, MANIFEST_URL, MANIFEST_URL),
+                                args.repeat)
+        dump_ms = time_call(lambda: json.dumps(manifest), args.repeat)
+        total_ms = parse_ms + index_ms + decorate_ms + dump_ms
+        print '%8d %10.2f %10.2f %10.2f %10.2f %10.2f %12.0f' % (canvases, parse_ms, index_ms, decorate_ms, dump_ms,
+                                                                 total_ms, canvases * 1000.0 / total_ms)
+
+
+if __name__ == "__main__":
+    main()
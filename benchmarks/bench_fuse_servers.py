@@ -0,0 +1,92 @@
+# Compares manifest throughput and latency of running fuse deployments, e.g.
+#
+#   python benchmarks/bench_fuse_servers.py --concurrency 200 --requests 5000 \
+#       --server flask=http://localhost:80 --server async=http://localhost:8080 \
+#       lib0001 lib0002 arc0003
+
+import argparse
+import itertools
+import threading
+import time
+import requests
+
+
+def run_load(base_url, references, concurrency, total_requests):
+
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    counter = itertools.count()
+    urls = ['%s/work/%s.manifest' % (base_url.rstrip('/'), reference) for reference in references]
+
+    def worker():
+
+        session = requests.Session()
+        while True:
+            n = next(counter)
+            if n >= total_requests:
+                return
+            url = urls[n % len(urls)]
+            start = time.time()
+            try:
+                response = session.get(url, headers={'Accept-Encoding': 'gzip'})
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            elapsed = time.time() - start
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.time() - start
+
+    return summarise(latencies, errors[0], duration)
+
+
+def summarise(latencies, errors, duration):
+
+    latencies = sorted(latencies)
+    if len(latencies) == 0:
+        return {'requests': 0, 'errors': errors, 'rps': 0.0, 'p50_ms': 0.0, 'p99_ms': 0.0}
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / duration,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+
+
+def percentile(sorted_values, pct):
+
+    index = int(round((pct / 100.0) * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def main():
+
+    arg_parser = argparse.ArgumentParser(description='Compare waylon-fuse server deployments')
+    arg_parser.add_argument('--server', action='append', required=True,
+                            help='name=base_url of a running fuse server, may be repeated')
+    arg_parser.add_argument('--concurrency', type=int, default=50)
+    arg_parser.add_argument('--requests', type=int, default=1000)
+    arg_parser.add_argument('references', nargs='+', help='work references to request')
+    args = arg_parser.parse_args()
+
+    print '%-12s %8s %8s %10s %10s %10s' % ('server', 'requests', 'errors', 'req/s', 'p50 ms', 'p99 ms')
+    for server in args.server:
+        name, base_url = server.split('=', 1)
+        result = run_load(base_url, args.references, args.concurrency, args.requests)
+        print '%-12s %8d %8d %10.1f %10.1f %10.1f' % (name, result['requests'], result['errors'], result['rps'],
+                                                      result['p50_ms'], result['p99_ms'])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# Measures memory retained by parsed works (images, image collection and image metadata), e.g.
+#
+#   python benchmarks/bench_memory.py --rows 10000 100000
+
+import argparse
+import gc
+import os
+import sys
+import tempfile
+from multiprocessing import Process, Queue
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import synthetic
+
+
+def get_rss_kb():
+
+    # current (not peak) resident set size, so memory released after parsing is not counted
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def run_retained(kind, rows, result_queue):
+
+    import RCVS_parser
+
+    handle, path = tempfile.mkstemp(suffix='.txt')
+    os.close(handle)
+    try:
+        synthetic.write_tsv(path, kind, '0001', rows)
+        parser = RCVS_parser.Parser()
+        gc.collect()
+        baseline_kb = get_rss_kb()
+        response = parser.parse('%s0001.txt' % (kind,), path)
+        gc.collect()
+        retained_kb = get_rss_kb() - baseline_kb
+        images = response.works[0].image_collection.total_items
+    finally:
+        os.remove(path)
+    result_queue.put((images, retained_kb))
+
+
+def main():
+
+    arg_parser = argparse.ArgumentParser(description='Benchmark memory retained by parsed works')
+    arg_parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    arg_parser.add_argument('--kinds', nargs='+', default=['lib', 'arc'])
+    args = arg_parser.parse_args()
+
+    print '%-5s %8s %12s %14s' % ('kind', 'images', 'retained MB', 'bytes/image')
+    for kind in args.kinds:
+        for rows in args.rows:
+            result_queue = Queue()
+            process = Process(target=run_retained, args=(kind, rows, result_queue))
+            process.start()
+            images, retained_kb = result_queue.get()
+            process.join()
+            print '%-5s %8d %12.1f %14.0f' % (kind, images, retained_kb / 1024.0,
+                                              retained_kb * 1024.0 / max(images, 1))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# Compares the JSON and compact encodings of stored work metadata for object size, encode and decode time,
+# and checks that manifests decorated from either are identical, e.g.
+#
+#   python benchmarks/bench_metadata_encoding.py --canvases 100 1000 10000
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import synthetic
+from manifest_decoration import WorkIndex, decorate_manifest
+from metadata_encoding import encode_work_data, decode_work_data, JSON_FORMAT, COMPACT_FORMAT
+
+MANIFEST_URL = 'http://localhost/work/0001.manifest'
+
+
+def time_call(function, repeat):
+
+    return min(timeit.repeat(function, number=1, repeat=repeat)) * 1000
+
+
+def get_decorated(data, canvases):
+
+    manifest = synthetic.get_dlcs_manifest('0001', canvases)
+    decorate_manifest(WorkIndex(data), manifest, MANIFEST_URL, MANIFEST_URL)
+    return json.dumps(manifest)
+
+
+def check_equivalence(json_body, compact_body, canvases):
+
+    from_json = decode_work_data(json_body)
+    from_compact = decode_work_data(compact_body)
+    if from_json != from_compact or from_json['toc'].keys() != from_compact['toc'].keys():
+        raise AssertionError('compact encoding does not round trip for %d canvases' % (canvases,))
+    if get_decorated(from_json, canvases) != get_decorated(from_compact, canvases):
+        raise AssertionError('manifests decorated from the two encodings differ for %d canvases' % (canvases,))
+
+
+def main():
+
+    arg_parser = argparse.ArgumentParser(description='Benchmark stored work metadata encodings')
+    arg_parser.add_argument('--canvases', type=int, nargs='+', default=[100, 1000, 10000])
+    arg_parser.add_argument('--repeat', type=int, default=10)
+    args = arg_parser.parse_args()
+
+    print '%8s %8s %10s %10s %10s %10s %10s' % ('canvases', 'format', 'bytes', 'ratio', 'encode ms', 'decode ms',
+                                                 'speedup')
+    for canvases in args.canvases:
+        data = synthetic.get_work_data(canvases)
+        data['images'] = ['https://example.org/rcvs/0001/0001_%05d.jpg' % (index,) for index in range(canvases)]
+        json_body = encode_work_data(data, JSON_FORMAT)
+        compact_body = encode_work_data(data, COMPACT_FORMAT)
+        check_equivalence(json_body, compact_body, canvases)
+
+        json_decode_ms = None
+        for encoding_format, body in [(JSON_FORMAT, json_body), (COMPACT_FORMAT, compact_body)]:
+            encode_ms = time_call(lambda: encode_work_data(data, encoding_format), args.repeat)
+            decode_ms = time_call(lambda: decode_work_data(body), args.repeat)
+            if json_decode_ms is None:
+                json_decode_ms = decode_ms
+            print '%8d %8s %10d %10.2f %10.2f %10.2f %10.2f' % (canvases, encoding_format, len(body),
+                                                                float(len(json_body)) / len(body), encode_ms,
+                                                                decode_ms, json_decode_ms / decode_ms)
+
+
+if __name__ == "__main__":
+    main()
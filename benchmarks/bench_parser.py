@@ -0,0 +1,59 @@
+# Measures parser throughput and peak memory over synthetic TSVs, e.g.
+#
+#   python benchmarks/bench_parser.py --rows 1000 10000 100000
+
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+from multiprocessing import Process, Queue
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import synthetic
+
+
+def run_parse(kind, rows, result_queue):
+
+    import RCVS_parser
+
+    handle, path = tempfile.mkstemp(suffix='.txt')
+    os.close(handle)
+    try:
+        synthetic.write_tsv(path, kind, '0001', rows)
+        parser = RCVS_parser.Parser()
+        baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.time()
+        response = parser.parse('%s0001.txt' % (kind,), path)
+        elapsed = time.time() - start
+        peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        images = response.works[0].image_collection.total_items
+    finally:
+        os.remove(path)
+    result_queue.put((elapsed, images, peak_kb, peak_kb - baseline_kb))
+
+
+def main():
+
+    arg_parser = argparse.ArgumentParser(description='Benchmark the configured parser on synthetic TSVs')
+    arg_parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000])
+    arg_parser.add_argument('--kinds', nargs='+', default=['lib', 'arc'])
+    args = arg_parser.parse_args()
+
+    print '%-5s %8s %10s %12s %12s %12s' % ('kind', 'rows', 'seconds', 'rows/s', 'peak MB', 'parse MB')
+    for kind in args.kinds:
+        for rows in args.rows:
+            # each run gets a fresh process so peak memory is not inherited from earlier runs
+            result_queue = Queue()
+            process = Process(target=run_parse, args=(kind, rows, result_queue))
+            process.start()
+            elapsed, images, peak_kb, parse_kb = result_queue.get()
+            process.join()
+            print '%-5s %8d %10.3f %12.0f %12.1f %12.1f' % (kind, images, elapsed, images / max(elapsed, 1e-9),
+                                                            peak_kb / 1024.0, parse_kb / 1024.0)
+
+
+if __name__ == "__main__":
+    main()
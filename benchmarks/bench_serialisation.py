@@ -0,0 +1,59 @@
+# Compares ImageCollection.as_json with the streaming iter_json serialiser; tests/test_image_collection.py checks
+# that both produce the same document, e.g.
+#
+#   python benchmarks/bench_serialisation.py --images 1000 10000 100000
+
+import argparse
+import os
+import resource
+import sys
+import time
+from multiprocessing import Process, Queue
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from dlcs.image_collection import Image, ImageCollection
+
+
+def get_collection(count):
+
+    images = [Image(space=3, origin=u'https://example.org/rcvs/0001/0001_%05d.jpg' % (index,), string_1='0001',
+                    number_1=0, number_2=index) for index in range(count)]
+    return ImageCollection(images)
+
+
+def run_serialiser(mode, count, result_queue):
+
+    collection = get_collection(count)
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    size = 0
+    if mode == 'as_json':
+        size = len(collection.as_json())
+    else:
+        for chunk in collection.iter_json():
+            size += len(chunk)
+    elapsed = time.time() - start
+    extra_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_kb
+    result_queue.put((elapsed, size, extra_kb))
+
+
+def main():
+
+    arg_parser = argparse.ArgumentParser(description='Benchmark ImageCollection serialisation')
+    arg_parser.add_argument('--images', type=int, nargs='+', default=[1000, 10000, 100000])
+    args = arg_parser.parse_args()
+
+    print '%-10s %8s %10s %12s %14s' % ('mode', 'images', 'seconds', 'body MB', 'extra peak MB')
+    for count in args.images:
+        for mode in ['as_json', 'iter_json']:
+            result_queue = Queue()
+            process = Process(target=run_serialiser, args=(mode, count, result_queue))
+            process.start()
+            elapsed, size, extra_kb = result_queue.get()
+            process.join()
+            print '%-10s %8d %10.3f %12.1f %14.1f' % (mode, count, elapsed, size / 1048576.0, extra_kb / 1024.0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+# Runs waylon-ingest.py and waylon-fuse.py end to end against local stand-ins (in-process S3 and SQS, and a stub
+# DLCS HTTP server in its own process) over synthetic lib and arc TSVs, reporting ingest works/minute, manifest
+# requests/second with p50/p99 latency, and the peak RSS of each service, e.g.
+#
+#   python benchmarks/bench_services.py --works 40 --rows 50 500 2000 --requests 5000 --concurrency 20 \
+#       --dlcs-latency 20 --s3-latency 5
+#
+# Ingest runs with a thread pool so its workers share the in-process stand-ins. Settings come from settings.py,
+# or settings-example.py when there is none, with the service endpoints pointed at the stand-ins.
+
+import argparse
+import imp
+import json
+import logging
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing import Process, Queue, Event
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+import synthetic
+import stand_ins
+from bench_fuse_servers import run_load
+
+SOURCE_BUCKET = 'bench-source'
+KINDS = ['lib', 'arc']
+
+
+def load_settings(overrides):
+
+    try:
+        import settings
+    except ImportError:
+        settings = imp.load_source('settings', os.path.join(ROOT, 'settings-example.py'))
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+    return settings
+
+
+def get_overrides(work_dir, dlcs_url):
+
+    return {
+        'DLCS_ENTRY': dlcs_url,
+        'DLCS_DELETE_PATH': dlcs_url + 'customers/49/deleteImages',
+        'DLCS_RESOURCE_ENTRY': dlcs_url,
+        'DLCS_BATCH_POLL_INTERVAL': 0.5,
+        'META_S3': 'bench-meta',
+        'INPUT_QUEUE': 'bench-input',
+        'ERROR_QUEUE': '',
+        'FAILURE_JOURNAL_PATH': os.path.join(work_dir, 'failures.jsonl'),
+        'TMP_PATH': work_dir,
+        'INGEST_POOL_TYPE': 'thread',
+        'DELETE_FLUSH_INTERVAL': 0.2,
+        'PUBLISH_MANIFESTS': False,
+        'SERVE_PUBLISHED_MANIFESTS': False,
+        'MANIFEST_CACHE_PATH': None,
+        'FUSE_WARM_UP': False,
+        'WORK_INDEX_SYNC_ON_START': False,
+        'METRICS_DUMP_PATH': None,
+        'RCVS_RELATIVE': 'rcvs/',
+    }
+
+
+def get_peak_rss_mb():
+
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run_dlcs_stub(latency, result_queue):
+
+    server = stand_ins.DLCSServer(latency=latency)
+    result_queue.put(server.url)
+    server.serve_forever()
+
+
+def get_notification(bucket, key, etag):
+
+    return {'Records': [{'s3': {'bucket': {'name': bucket}, 'object': {'key': key, 'eTag': etag}}}]}
+
+
+def run_ingest(args, work_dir, result_queue):
+
+    import settings
+
+    s3_client = stand_ins.FakeS3Client(latency=args.s3_latency / 1000.0)
+    input_queue = stand_ins.FakeQueue(settings.INPUT_QUEUE)
+    settings.WORK_INDEX_PATH = os.path.join(work_dir, 'ingest-works.db')
+
+    ingest = imp.load_source('waylon_ingest', os.path.join(ROOT, 'waylon-ingest.py'))
+    ingest.boto3 = stand_ins.FakeBoto3(s3_client, {settings.INPUT_QUEUE: input_queue})
+    ingest.STOP_FILE = os.path.join(work_dir, 'stop')
+
+    images = 0
+    for n in range(args.works):
+        kind = KINDS[n % len(KINDS)]
+        rows = args.rows[n % len(args.rows)]
+        key = '%s_%05d.txt' % (kind, n)
+        body = ''.join(synthetic.get_tsv_lines(kind, '%05d' % (n,), rows, seed=n))
+        etag = s3_client.put_object(Bucket=SOURCE_BUCKET, Key=key, Body=body)['ETag']
+        input_queue.send_message(MessageBody=json.dumps(get_notification(SOURCE_BUCKET, key, etag)))
+        images += rows
+
+    def stop_when_drained():
+        while input_queue.count() > 0:
+            time.sleep(0.05)
+        open(ingest.STOP_FILE, 'w').close()
+
+    watcher = threading.Thread(target=stop_when_drained)
+    watcher.daemon = True
+    start = time.time()
+    watcher.start()
+    sys.argv = ['waylon-ingest.py']
+    try:
+        ingest.main()
+    except SystemExit:
+        pass
+    elapsed = time.time() - start
+
+    contents = s3_client.get_contents()
+    stored = len([key for key in contents.get(settings.META_S3, {}) if key.startswith('work-')])
+    result_queue.put({
+        'works': args.works,
+        'stored': stored,
+        'images': images,
+        'seconds': elapsed,
+        'peak_rss_mb': get_peak_rss_mb(),
+        'contents': contents,
+    })
+
+
+def run_fuse(args, work_dir, name, contents, cache_bytes, result_queue, stop_event):
+
+    import settings
+    from werkzeug.serving import make_server
+
+    settings.MANIFEST_CACHE_MAX_BYTES = cache_bytes
+    settings.WORK_INDEX_PATH = os.path.join(work_dir, 'fuse-%s-works.db' % (name,))
+    s3_client = stand_ins.FakeS3Client(latency=args.s3_latency / 1000.0, contents=contents)
+
+    import fuse_resources
+    fuse_resources.boto3 = stand_ins.FakeBoto3(s3_client)
+    fuse = imp.load_source('waylon_fuse', os.path.join(ROOT, 'waylon-fuse.py'))
+    resources = fuse_resources.get_resources()
+    fuse.metadata_index.sync(resources.s3_client, settings.META_S3, resources.sync_executor)
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, fuse.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    result_queue.put('http://127.0.0.1:%d' % (server.server_port,))
+    stop_event.wait()
+    server.shutdown()
+    result_queue.put(get_peak_rss_mb())
+
+
+def run_fuse_passes(args, work_dir, name, contents, cache_bytes, passes, references):
+
+    result_queue = Queue()
+    stop_event = Event()
+    process = Process(target=run_fuse, args=(args, work_dir, name, contents, cache_bytes, result_queue,
+                                             stop_event))
+    process.start()
+    base_url = result_queue.get()
+    results = []
+    for pass_name, requests in passes:
+        results.append((pass_name, run_load(base_url, references, args.concurrency, requests)))
+    stop_event.set()
+    peak_rss_mb = result_queue.get()
+    process.join()
+    return [(pass_name, result, peak_rss_mb) for pass_name, result in results]
+
+
+def main():
+
+    arg_parser = argparse.ArgumentParser(description='Benchmark ingest and fuse against local stand-ins')
+    arg_parser.add_argument('--works', type=int, default=20)
+    arg_parser.add_argument('--rows', type=int, nargs='+', default=[50, 500, 2000],
+                            help='images per work, cycled through the works')
+    arg_parser.add_argument('--requests', type=int, default=2000)
+    arg_parser.add_argument('--concurrency', type=int, default=20)
+    arg_parser.add_argument('--dlcs-latency', type=float, default=0.0, help='milliseconds per DLCS request')
+    arg_parser.add_argument('--s3-latency', type=float, default=0.0, help='milliseconds per S3 call')
+    args = arg_parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    work_dir = tempfile.mkdtemp(prefix='waylon-bench-')
+    stub_queue = Queue()
+    stub = Process(target=run_dlcs_stub, args=(args.dlcs_latency / 1000.0, stub_queue))
+    stub.daemon = True
+    stub.start()
+    try:
+        load_settings(get_overrides(work_dir, stub_queue.get()))
+
+        result_queue = Queue()
+        process = Process(target=run_ingest, args=(args, work_dir, result_queue))
+        process.start()
+        ingest = result_queue.get()
+        process.join()
+
+        print '%-10s %8s %8s %8s %10s %10s %12s' % ('ingest', 'works', 'stored', 'images', 'seconds', 'works/min',
+                                                    'peak RSS MB')
+        print '%-10s %8d %8d %8d %10.2f %10.1f %12.1f' % ('', ingest['works'], ingest['stored'], ingest['images'],
+                                                          ingest['seconds'],
+                                                          ingest['works'] * 60.0 / ingest['seconds'],
+                                                          ingest['peak_rss_mb'])
+
+        references = ['%05d' % (n,) for n in range(args.works)]
+        results = run_fuse_passes(args, work_dir, 'cached', ingest['contents'], 64 * 1024 * 1024,
+                                  [('cold', len(references)), ('warm', args.requests)], references)
+        results += run_fuse_passes(args, work_dir, 'uncached', ingest['contents'], 0,
+                                   [('uncached', args.requests)], references)
+
+        print
+        print '%-10s %8s %8s %10s %10s %10s %12s' % ('fuse', 'requests', 'errors', 'req/s', 'p50 ms', 'p99 ms',
+                                                     'peak RSS MB')
+        for pass_name, result, peak_rss_mb in results:
+            print '%-10s %8d %8d %10.1f %10.1f %10.1f %12.1f' % (pass_name, result['requests'], result['errors'],
+                                                                 result['rps'], result['p50_ms'], result['p99_ms'],
+                                                                 peak_rss_mb)
+    finally:
+        stub.terminate()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,511 @@
+# Local stand-ins for the services fuse and ingest depend on: an in-process S3 client and SQS queue with the
+# subset of the boto3 interface the services use, and a stub DLCS HTTP server
+
+import BaseHTTPServer
+import SocketServer
+import hashlib
+import itertools
+import json
+import re
+import threading
+import time
+import uuid
+from StringIO import StringIO
+from datetime import datetime
+from email.utils import formatdate
+
+import synthetic
+
+
+class ClientError(Exception):
+
+    def __init__(self, code, message=''):
+
+        super(ClientError, self).__init__(message or code)
+        self.response = {'Error': {'Code': code, 'Message': message}}
+
+
+class NoSuchKey(ClientError):
+
+    def __init__(self, key):
+
+        super(NoSuchKey, self).__init__('NoSuchKey', key)
+
+
+class S3Exceptions(object):
+
+    ClientError = ClientError
+    NoSuchKey = NoSuchKey
+
+
+class StreamingBody(object):
+
+    def __init__(self, data):
+
+        self.stream = StringIO(data)
+
+    def read(self, amount=None):
+
+        if amount is None:
+            return self.stream.read()
+        return self.stream.read(amount)
+
+    def close(self):
+
+        self.stream.close()
+
+
+class S3Object(object):
+
+    __slots__ = ('body', 'etag', 'metadata', 'last_modified')
+
+    def __init__(self, body, metadata=None):
+
+        self.body = body
+        self.etag = '"%s"' % (hashlib.md5(body).hexdigest(),)
+        self.metadata = metadata or {}
+        self.last_modified = datetime.utcnow()
+
+
+class FakeS3Client(object):
+
+    # objects are held in memory per bucket; latency is added to every call to model a round trip
+
+    exceptions = S3Exceptions
+
+    def __init__(self, latency=0.0, contents=None):
+
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.buckets = {}
+        for bucket, objects in (contents or {}).items():
+            for key, (body, metadata) in objects.items():
+                self.buckets.setdefault(bucket, {})[key] = S3Object(body, metadata)
+
+    def get_contents(self):
+
+        # picklable copy of every object, to hand the store to another process
+        with self.lock:
+            return dict((bucket, dict((key, (obj.body, obj.metadata)) for key, obj in objects.items()))
+                        for bucket, objects in self.buckets.items())
+
+    def wait(self):
+
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def get(self, bucket, key):
+
+        with self.lock:
+            obj = self.buckets.get(bucket, {}).get(key)
+        if obj is None:
+            raise NoSuchKey(key)
+        return obj
+
+    def get_object(self, Bucket, Key, **kwargs):
+
+        self.wait()
+        obj = self.get(Bucket, Key)
+        return {'Body': StreamingBody(obj.body), 'ETag': obj.etag, 'Metadata': dict(obj.metadata),
+                'LastModified': obj.last_modified, 'ContentLength': len(obj.body)}
+
+    def head_object(self, Bucket, Key, **kwargs):
+
+        self.wait()
+        try:
+            obj = self.get(Bucket, Key)
+        except NoSuchKey:
+            # as with S3, a HEAD of a missing key is a plain 404 rather than NoSuchKey
+            raise ClientError('404', Key)
+        return {'ETag': obj.etag, 'Metadata': dict(obj.metadata), 'LastModified': obj.last_modified,
+                'ContentLength': len(obj.body)}
+
+    def head_bucket(self, Bucket):
+
+        self.wait()
+        return {}
+
+    def put_object(self, Bucket, Key, Body, Metadata=None, **kwargs):
+
+        self.wait()
+        if hasattr(Body, 'read'):
+            Body = Body.read()
+        if isinstance(Body, unicode):
+            Body = Body.encode('utf-8')
+        obj = S3Object(Body, Metadata)
+        with self.lock:
+            self.buckets.setdefault(Bucket, {})[Key] = obj
+        return {'ETag': obj.etag}
+
+    def copy_object(self, Bucket, Key, CopySource, Metadata=None, MetadataDirective='COPY', **kwargs):
+
+        self.wait()
+        source = self.get(CopySource['Bucket'], CopySource['Key'])
+        metadata = Metadata if MetadataDirective == 'REPLACE' else source.metadata
+        obj = S3Object(source.body, metadata)
+        with self.lock:
+            self.buckets.setdefault(Bucket, {})[Key] = obj
+        return {'CopyObjectResult': {'ETag': obj.etag}}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+
+        self.wait()
+        with self.lock:
+            self.buckets.get(Bucket, {}).pop(Key, None)
+        return {}
+
+    def download_file(self, bucket, key, filename):
+
+        self.wait()
+        with open(filename, 'wb') as download:
+            download.write(self.get(bucket, key).body)
+
+    def get_paginator(self, operation_name):
+
+        return ListObjectsPaginator(self)
+
+
+class ListObjectsPaginator(object):
+
+    def __init__(self, client, page_size=1000):
+
+        self.client = client
+        self.page_size = page_size
+
+    def paginate(self, Bucket, Prefix=''):
+
+        with self.client.lock:
+            objects = sorted((key, obj) for key, obj in self.client.buckets.get(Bucket, {}).items()
+                             if key.startswith(Prefix))
+        for start in range(0, len(objects), self.page_size):
+            self.client.wait()
+            yield {'Contents': [{'Key': key, 'ETag': obj.etag, 'Size': len(obj.body),
+                                 'LastModified': obj.last_modified}
+                                for key, obj in objects[start:start + self.page_size]]}
+
+
+class Message(object):
+
+    def __init__(self, queue, message_id, body):
+
+        self.queue = queue
+        self.message_id = message_id
+        self.body = body
+        self.receipt_handle = None
+        self.visible_at = 0
+
+
+class FakeQueue(object):
+
+    # long polls are capped at max_wait so consumers notice a stop request promptly
+
+    def __init__(self, name, max_wait=0.5):
+
+        self.name = name
+        self.max_wait = max_wait
+        self.condition = threading.Condition()
+        self.messages = []
+        self.sent = 0
+        self.deleted = 0
+
+    def send_message(self, MessageBody, **kwargs):
+
+        with self.condition:
+            message = Message(self, str(uuid.uuid4()), MessageBody)
+            self.messages.append(message)
+            self.sent += 1
+            self.condition.notify_all()
+        return {'MessageId': message.message_id}
+
+    def receive_messages(self, MaxNumberOfMessages=1, VisibilityTimeout=30, WaitTimeSeconds=0, **kwargs):
+
+        deadline = time.time() + min(WaitTimeSeconds, self.max_wait)
+        with self.condition:
+            while True:
+                now = time.time()
+                received = []
+                for message in self.messages:
+                    if len(received) >= MaxNumberOfMessages:
+                        break
+                    if message.visible_at <= now:
+                        message.visible_at = now + VisibilityTimeout
+                        message.receipt_handle = str(uuid.uuid4())
+                        received.append(message)
+                if len(received) > 0 or now >= deadline:
+                    return received
+                self.condition.wait(deadline - now)
+
+    def delete_messages(self, Entries):
+
+        handles = dict((entry['ReceiptHandle'], entry['Id']) for entry in Entries)
+        successful = []
+        with self.condition:
+            remaining = []
+            for message in self.messages:
+                if message.receipt_handle in handles:
+                    successful.append({'Id': handles[message.receipt_handle]})
+                else:
+                    remaining.append(message)
+            self.messages = remaining
+            self.deleted += len(successful)
+        deleted_ids = set(entry['Id'] for entry in successful)
+        failed = [{'Id': entry['Id'], 'Message': 'receipt handle not found'}
+                  for entry in Entries if entry['Id'] not in deleted_ids]
+        return {'Successful': successful, 'Failed': failed}
+
+    def change_message_visibility_batch(self, Entries):
+
+        with self.condition:
+            by_handle = dict((message.receipt_handle, message) for message in self.messages)
+            for entry in Entries:
+                message = by_handle.get(entry['ReceiptHandle'])
+                if message is not None:
+                    message.visible_at = time.time() + entry['VisibilityTimeout']
+        return {'Successful': [{'Id': entry['Id']} for entry in Entries], 'Failed': []}
+
+    def count(self):
+
+        with self.condition:
+            return len(self.messages)
+
+
+class FakeSQSResource(object):
+
+    def __init__(self, queues):
+
+        self.queues = queues
+
+    def get_queue_by_name(self, QueueName):
+
+        return self.queues[QueueName]
+
+
+class FakeBoto3(object):
+
+    # stands in for the boto3 module in the services under test
+
+    def __init__(self, s3_client, queues=None):
+
+        self.s3_client = s3_client
+        self.queues = queues or {}
+
+    def client(self, service_name, *args, **kwargs):
+
+        if service_name != 's3':
+            raise ValueError("No stand-in for %s clients" % (service_name,))
+        return self.s3_client
+
+    def resource(self, service_name, *args, **kwargs):
+
+        if service_name != 'sqs':
+            raise ValueError("No stand-in for %s resources" % (service_name,))
+        return FakeSQSResource(self.queues)
+
+
+class DLCSState(object):
+
+    # images registered through the queue, grouped by work (string1) and ordered by number2
+
+    def __init__(self):
+
+        self.lock = threading.Lock()
+        self.works = {}  # work id -> {image id: image}
+        self.image_works = {}  # image id -> work id
+        self.versions = {}  # work id -> version, bumped whenever the work's images change
+        self.batches = {}
+        self.ids = itertools.count(1)
+        self.requests = 0
+
+    def add_images(self, members):
+
+        with self.lock:
+            for member in members:
+                image_id = 'img%08d' % (next(self.ids),)
+                work_id = member.get('string1')
+                self.works.setdefault(work_id, {})[image_id] = dict(member, id=image_id)
+                self.image_works[image_id] = work_id
+                self.bump(work_id)
+
+    def add_batch(self, batch):
+
+        with self.lock:
+            batch_id = next(self.ids)
+            self.batches[batch_id] = batch
+            return batch_id
+
+    def remove_images(self, image_ids):
+
+        with self.lock:
+            for image_id in image_ids:
+                image_id = image_id.rsplit('/', 1)[-1]
+                work_id = self.image_works.pop(image_id, None)
+                if work_id is not None:
+                    del self.works[work_id][image_id]
+                    self.bump(work_id)
+
+    def patch_image(self, image_id, data):
+
+        with self.lock:
+            work_id = self.image_works.get(image_id)
+            if work_id is None:
+                return False
+            self.works[work_id][image_id].update(data)
+            self.bump(work_id)
+            return True
+
+    def bump(self, work_id):
+
+        self.versions[work_id] = self.versions.get(work_id, 0) + 1
+
+    def get_work_images(self, work_id):
+
+        with self.lock:
+            images = list(self.works.get(work_id, {}).values())
+            version = self.versions.get(work_id, 0)
+        images.sort(key=lambda image: image.get('number2'))
+        return images, version
+
+
+class DLCSRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    # implements the iiif-resource and raw-resource named queries, queue, batch, deleteImages and image PATCH
+
+    protocol_version = 'HTTP/1.1'
+
+    named_query = re.compile(r'^/(iiif-resource|raw-resource)/\d+/[^/]+/([^/]+)/\d+$')
+    queue = re.compile(r'^/customers/\d+/queue$')
+    batch = re.compile(r'^/customers/\d+/queue/batches/(\d+)$')
+    delete_images = re.compile(r'^/customers/[^/]+/deleteImages$')
+    image = re.compile(r'^/customers/\d+/spaces/\d+/images/([^/]+)$')
+
+    def log_message(self, format, *args):
+
+        pass
+
+    def start(self):
+
+        self.server.state.requests += 1
+        if self.server.latency > 0:
+            time.sleep(self.server.latency)
+
+    def do_HEAD(self):
+
+        self.start()
+        self.send_json(200, {})
+
+    def do_GET(self):
+
+        self.start()
+        path = self.path.split('?', 1)[0]
+        match = self.named_query.match(path)
+        if match is not None:
+            kind, work_id = match.groups()
+            images, version = self.server.state.get_work_images(work_id)
+            if kind == 'raw-resource':
+                self.send_json(200, [image['id'] for image in images])
+                return
+            etag = '"%s-%d"' % (work_id, version)
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_json(200, synthetic.get_dlcs_manifest(work_id, len(images)),
+                           {'ETag': etag, 'Last-Modified': formatdate(usegmt=True)})
+            return
+        match = self.batch.match(path)
+        if match is not None:
+            batch = self.server.state.batches.get(int(match.group(1)))
+            if batch is None:
+                self.send_json(404, {})
+            else:
+                self.send_json(200, batch)
+            return
+        self.send_json(404, {})
+
+    def do_POST(self):
+
+        self.start()
+        body = self.read_body()
+        if self.queue.match(self.path):
+            members = json.loads(body).get('member') or []
+            self.server.state.add_images(members)
+            batch = {
+                '@type': 'Batch',
+                'count': len(members),
+                'completed': len(members),
+                'errors': 0,
+                'finished': formatdate(usegmt=True),
+            }
+            batch_id = self.server.state.add_batch(batch)
+            batch['@id'] = '%s%s/batches/%d' % (self.server.url.rstrip('/'), self.path, batch_id)
+            self.send_json(201, batch)
+        elif self.delete_images.match(self.path):
+            members = json.loads(body).get('member') or []
+            self.server.state.remove_images([member.get('id') for member in members if member.get('id')])
+            self.send_json(200, {})
+        else:
+            self.send_json(404, {})
+
+    def do_PATCH(self):
+
+        self.start()
+        body = self.read_body()
+        match = self.image.match(self.path)
+        if match is not None and self.server.state.patch_image(match.group(1), json.loads(body)):
+            self.send_json(200, {})
+        else:
+            self.send_json(404, {})
+
+    def read_body(self):
+
+        # queue and delete requests may be streamed with chunked transfer encoding
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(';', 1)[0].strip(), 16)
+                if size == 0:
+                    # trailer, ended by an empty line
+                    while self.rfile.readline() not in ('\r\n', '\n', ''):
+                        pass
+                    return ''.join(chunks)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length)
+
+    def send_json(self, status, data, headers=None):
+
+        body = json.dumps(data)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class DLCSServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=0, latency=0.0):
+
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', port), DLCSRequestHandler)
+        self.latency = latency
+        self.state = DLCSState()
+
+    @property
+    def url(self):
+
+        return 'http://%s:%d/' % self.server_address
+
+    def start(self):
+
+        thread = threading.Thread(target=self.serve_forever, name='dlcs-stub')
+        thread.daemon = True
+        thread.start()
+        return thread
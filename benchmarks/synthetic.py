@@ -0,0 +1,127 @@
+# Generates synthetic RCVS library and archive TSVs for benchmarks
+
+import random
+
+LIB_COLUMNS = ['File name', 'Work Title', 'Repository', 'Collection', 'Volume', 'Chapter', 'Issue', 'Date',
+               'Publication Info', 'Material Type', 'General Note', 'Language', 'Copyright', 'Permalink',
+               'Viewing Mode', 'Contents', 'Page', 'Article', 'Author', 'Subject', 'Catalogue Entry URL']
+
+ARC_COLUMNS = ['File name', 'Work Title', 'Repository', 'Collection', 'Series', 'Subseries', 'Catalogue ref',
+               'Copyright', 'Permalink', 'Viewing Mode', 'Contents', 'Title', 'Date', 'Description', 'Creator',
+               'Format', 'Catalogue Entry URL']
+
+WORDS = ['veterinary', 'record', 'horse', 'anatomy', 'surgery', 'journal', 'society', 'college', 'lecture',
+         'disease', 'cattle', 'treatment', u'caf\xe9', 'report', 'annual', 'practice', 'council', 'royal']
+
+
+def get_text(rng, words):
+
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def generate_rows(kind, work_id, rows, seed=1):
+
+    rng = random.Random(seed)
+    columns = LIB_COLUMNS if kind == 'lib' else ARC_COLUMNS
+    work_row = dict((column, get_text(rng, 3)) for column in columns)
+    work_row['Viewing Mode'] = '2'
+    work_row['File name'] = ''
+    work_row['Contents'] = ''
+    yield [work_row.get(column, '') for column in columns]
+
+    articles = ['Article %d %s' % (n, get_text(rng, 2)) for n in range(max(rows // 20, 1))]
+    for index in range(rows):
+        row = {
+            'File name': '%s/%s_%05d.jpg' % (work_id, work_id, index),
+            'Contents': ' | '.join(rng.sample(articles, min(len(articles), rng.randint(0, 2)))),
+            'Page': str(index + 1),
+            'Article': get_text(rng, 4),
+            'Author': get_text(rng, 2),
+            'Subject': get_text(rng, 3) if rng.random() < 0.5 else '',
+            'Catalogue Entry URL': 'http://example.org/catalogue/%s/%d' % (work_id, index),
+            'Catalogue ref': 'RCVS/%s/%d' % (work_id, index),
+            'Title': get_text(rng, 5),
+            'Date': str(1800 + rng.randint(0, 150)),
+            'Description': get_text(rng, 20),
+            'Creator': get_text(rng, 2),
+            'Format': 'Photograph',
+        }
+        yield [row.get(column, '') for column in columns]
+
+
+def get_tsv_lines(kind, work_id, rows, seed=1):
+
+    columns = LIB_COLUMNS if kind == 'lib' else ARC_COLUMNS
+    lines = ['\xef\xbb\xbf' + '\t'.join(columns) + '\r\n']
+    for row in generate_rows(kind, work_id, rows, seed):
+        lines.append(u'\t'.join(row).encode('utf-8') + '\r\n')
+    return lines
+
+
+def write_tsv(path, kind, work_id, rows, seed=1):
+
+    with open(path, 'wb') as tsv_file:
+        tsv_file.writelines(get_tsv_lines(kind, work_id, rows, seed))
+
+
+def get_dlcs_manifest(work_id, canvases):
+
+    # shaped like a DLCS named-query manifest
+    base = 'https://dlcs.io/iiif-resource/50/waylon-rcdd/%s/0' % (work_id,)
+    return {
+        '@context': 'http://iiif.io/api/presentation/2/context.json',
+        '@id': base,
+        '@type': 'sc:Manifest',
+        'label': 'Generated from DLCS named query',
+        'sequences': [{
+            '@id': base + '/sequence/0',
+            '@type': 'sc:Sequence',
+            'canvases': [{
+                '@id': base + '/canvas/c%d' % (index,),
+                '@type': 'sc:Canvas',
+                'label': 'Image %d' % (index + 1,),
+                'height': 3000,
+                'width': 2000,
+                'images': [{
+                    '@id': base + '/imageanno/%d' % (index,),
+                    '@type': 'oa:Annotation',
+                    'motivation': 'sc:painting',
+                    'on': base + '/canvas/c%d' % (index,),
+                    'resource': {
+                        '@id': 'https://dlcs.io/iiif-img/50/3/%s_%05d/full/full/0/default.jpg' % (work_id, index),
+                        '@type': 'dctypes:Image',
+                        'height': 3000,
+                        'width': 2000,
+                        'service': {
+                            '@context': 'http://iiif.io/api/image/2/context.json',
+                            '@id': 'https://dlcs.io/iiif-img/50/3/%s_%05d' % (work_id, index),
+                            'profile': 'http://iiif.io/api/image/2/level1.json'
+                        }
+                    }
+                }]
+            } for index in range(canvases)]
+        }]
+    }
+
+
+def get_work_data(canvases, seed=1):
+
+    # shaped like the work-<id> metadata stored by ingest for a library work
+    rng = random.Random(seed)
+    toc = {}
+    image_metadata = {}
+    articles = ['Article %d %s' % (n, get_text(rng, 2)) for n in range(max(canvases // 20, 1))]
+    for index in range(canvases):
+        for article in rng.sample(articles, min(len(articles), rng.randint(0, 2))):
+            toc.setdefault(article, []).append(index)
+        image_metadata[str(index)] = [
+            {'label': 'Page', 'value': str(index + 1)},
+            {'label': 'Article', 'value': get_text(rng, 4)},
+            {'label': 'Author', 'value': get_text(rng, 2)},
+        ]
+    return {
+        'meta': [{'label': 'Work Title', 'value': get_text(rng, 4)}, {'label': 'Date', 'value': '1890'}],
+        'toc': toc,
+        'flags': {'Viewing_Mode': '2', 'Canvas_Label_Field': 'Page'},
+        'image_metadata': image_metadata,
+    }
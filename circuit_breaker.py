@@ -0,0 +1,69 @@
+import logging
+import threading
+import time
+
+
+class CircuitBreaker(object):
+
+    # opens after a run of consecutive failures so callers fail fast instead of waiting on a service that is down;
+    # while open, one trial call is let through every reset_seconds and the first success closes it again
+
+    def __init__(self, name, failure_threshold, reset_seconds):
+
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self.rejected = 0
+
+    def is_open(self):
+
+        # true while calls should be refused, without claiming the next trial call
+        with self.lock:
+            return self.opened_at is not None and time.time() - self.opened_at < self.reset_seconds
+
+    def allow(self):
+
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            now = time.time()
+            if now - self.opened_at >= self.reset_seconds:
+                # restart the reset period so concurrent callers do not all become trial calls
+                self.opened_at = now
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+
+        with self.lock:
+            if self.opened_at is not None:
+                logging.info("Circuit breaker for %s closed" % (self.name,))
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+
+        with self.lock:
+            self.failures += 1
+            if self.failures < self.failure_threshold:
+                return
+            if self.opened_at is None:
+                self.trips += 1
+                logging.error("Circuit breaker for %s opened after %d consecutive failures" %
+                              (self.name, self.failures))
+            self.opened_at = time.time()
+
+    def stats(self):
+
+        with self.lock:
+            return {
+                'open': int(self.opened_at is not None),
+                'consecutive_failures': self.failures,
+                'trips': self.trips,
+                'rejected': self.rejected,
+            }
@@ -0,0 +1,137 @@
+import re
+import threading
+
+# reference of the collection listing every top-level collection
+TOP_REFERENCE = 'top'
+# separates collection and series slugs in a series reference
+SERIES_SEPARATOR = '--'
+
+
+class CollectionGroup(object):
+
+    def __init__(self, reference, label):
+
+        self.reference = reference
+        self.label = label
+        self.children = {}  # reference -> CollectionGroup
+        self.works = []  # (work id, label) pairs
+
+    def get_child(self, reference, label):
+
+        child = self.children.get(reference)
+        if child is None:
+            child = CollectionGroup(reference, label)
+            self.children[reference] = child
+        return child
+
+    def sort(self):
+
+        self.works.sort(key=lambda work: (work[1], work[0]))
+        for child in self.children.values():
+            child.sort()
+
+
+class CollectionTree(object):
+
+    # collections grouped from the work metadata index, regrouped only when the index revision changes
+
+    def __init__(self, metadata_index):
+
+        self.metadata_index = metadata_index
+        self.revision = None
+        self.groups = {}
+        self.lock = threading.Lock()
+
+    def get_group(self, reference):
+
+        # returns (index revision, group), the group being None for an unknown reference
+        revision = self.metadata_index.get_revision()
+        with self.lock:
+            if revision != self.revision:
+                self.groups = group_works(self.metadata_index.find_works())
+                self.revision = revision
+            return revision, self.groups.get(reference)
+
+
+def group_works(summaries):
+
+    top = CollectionGroup(TOP_REFERENCE, 'All collections')
+    groups = {TOP_REFERENCE: top}
+    for summary in summaries:
+        group = top
+        if summary.get('collection'):
+            group = top.get_child(get_slug(summary['collection']), summary['collection'])
+            if summary.get('series'):
+                group = group.get_child(group.reference + SERIES_SEPARATOR + get_slug(summary['series']),
+                                        summary['series'])
+        group.works.append((summary['id'], summary['label'] or summary['id']))
+
+    pending = [top]
+    while len(pending) > 0:
+        group = pending.pop()
+        groups[group.reference] = group
+        pending.extend(group.children.values())
+    top.sort()
+    return groups
+
+
+def get_slug(value):
+
+    return re.sub(r'[^a-z0-9]+', '-', value.lower()).strip('-') or 'untitled'
+
+
+def build_collection_document(group, url_root, page=None, page_size=100):
+
+    # IIIF Presentation 2 collection, paged when it has more members than fit on one page
+    collection_url = url_root + 'collection/' + group.reference
+    document = {
+        '@context': 'http://iiif.io/api/presentation/2/context.json',
+        '@type': 'sc:Collection',
+        'label': group.label,
+    }
+    members = sorted(group.children.values(), key=lambda child: child.label) + group.works
+    page_count = max((len(members) + page_size - 1) // page_size, 1)
+
+    if page is None:
+        document['@id'] = collection_url
+        if len(members) <= page_size:
+            add_members(document, members, url_root)
+            return document
+        document['total'] = len(members)
+        document['first'] = collection_url + '?page=1'
+        document['last'] = collection_url + '?page=' + str(page_count)
+        return document
+
+    if page < 1 or page > page_count:
+        return None
+    document['@id'] = collection_url + '?page=' + str(page)
+    document['within'] = collection_url
+    document['startIndex'] = (page - 1) * page_size
+    if page > 1:
+        document['prev'] = collection_url + '?page=' + str(page - 1)
+    if page < page_count:
+        document['next'] = collection_url + '?page=' + str(page + 1)
+    add_members(document, members[(page - 1) * page_size:page * page_size], url_root)
+    return document
+
+
+def add_members(document, members, url_root):
+
+    collections = []
+    manifests = []
+    for member in members:
+        if isinstance(member, CollectionGroup):
+            collections.append({
+                '@id': url_root + 'collection/' + member.reference,
+                '@type': 'sc:Collection',
+                'label': member.label,
+            })
+        else:
+            work_id, label = member
+            manifests.append({
+                '@id': url_root + 'work/' + work_id + '.manifest',
+                '@type': 'sc:Manifest',
+                'label': label,
+            })
+    document['collections'] = collections
+    document['manifests'] = manifests
@@ -1,2 +1,3 @@
 from image_collection import Image, ImageCollection
 import client
+import batch_tracker
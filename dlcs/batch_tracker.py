@@ -0,0 +1,165 @@
+import logging
+import threading
+import time
+import settings
+from dlcs.client import get_session
+
+
+class WorkBatches(object):
+
+    def __init__(self, work_id, batches, on_complete=None):
+
+        self.work_id = work_id
+        self.batches = batches
+        self.on_complete = on_complete
+        self.started = time.time()
+
+    def is_completed(self):
+
+        return all(batch.is_completed() for batch in self.batches)
+
+    def is_expired(self, max_age):
+
+        return time.time() - self.started > max_age
+
+    def status(self, expired=False):
+
+        count = sum(batch.count or 0 for batch in self.batches)
+        completed = sum(batch.completed or 0 for batch in self.batches)
+        errors = sum(batch.errors or 0 for batch in self.batches)
+        if expired:
+            # images DLCS never finished count as failed
+            errors = max(count - completed, errors)
+        return {
+            'work_id': self.work_id,
+            'batches': len(self.batches),
+            'count': count,
+            'completed': completed,
+            'errors': errors,
+            'finished': self.is_completed(),
+            'expired': expired,
+        }
+
+
+class BatchTracker(object):
+
+    def __init__(self, interval=None, max_interval=None, max_age=None):
+
+        self.interval = interval or settings.DLCS_BATCH_POLL_INTERVAL
+        self.max_interval = max_interval or settings.DLCS_BATCH_POLL_MAX_INTERVAL
+        self.max_age = max_age or settings.DLCS_BATCH_MAX_AGE
+        self.works = {}  # work id -> WorkBatches of each registration still being processed
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+
+    def track(self, work_id, batches, on_complete=None):
+
+        # on_complete is called with the work's status once all of its batches have finished, or once they are given
+        # up on after max_age. A work registered again while earlier batches are outstanding keeps both.
+        with self.lock:
+            self.works.setdefault(work_id, []).append(WorkBatches(work_id, batches, on_complete))
+        self.wake.set()
+
+    def status(self, work_id):
+
+        # status of the work's latest registration
+        with self.lock:
+            tracked = self.works.get(work_id)
+            if not tracked:
+                return None
+            work_batches = tracked[-1]
+        return work_batches.status()
+
+    def get_work_ids(self):
+
+        with self.lock:
+            return sorted(self.works.keys())
+
+    def outstanding(self):
+
+        with self.lock:
+            return sum(len(tracked) for tracked in self.works.values())
+
+    def wait(self, timeout=None):
+
+        # blocks until every tracked registration has completed or been given up on, returning False on timeout
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
+        while self.outstanding() > 0:
+            if deadline is not None and time.time() >= deadline:
+                return False
+            time.sleep(min(self.interval, 1))
+        return True
+
+    def poll(self):
+
+        # update every outstanding batch of every work in one pass, returning the statuses of finished works
+        with self.lock:
+            tracked = [work_batches for entries in self.works.values() for work_batches in entries]
+        session = get_session()
+        finished = []
+        for work_batches in tracked:
+            for batch in work_batches.batches:
+                if batch.is_completed():
+                    continue
+                try:
+                    batch.update(session=session)
+                except Exception:
+                    logging.exception("Could not update batch %s" % (batch.id,))
+            completed = work_batches.is_completed()
+            if not completed and not work_batches.is_expired(self.max_age):
+                continue
+            self.remove(work_batches)
+            status = work_batches.status(expired=not completed)
+            if completed:
+                logging.info("DLCS batches for work %s finished in %.1fs: %d completed, %d errors" % (
+                    work_batches.work_id, time.time() - work_batches.started, status['completed'], status['errors']))
+            else:
+                logging.error("Gave up on DLCS batches for work %s after %.1fs: %d of %d images completed" % (
+                    work_batches.work_id, time.time() - work_batches.started, status['completed'], status['count']))
+            if work_batches.on_complete is not None:
+                try:
+                    work_batches.on_complete(status)
+                except Exception:
+                    logging.exception("Error handling completion of work %s" % (work_batches.work_id,))
+            finished.append(status)
+        return finished
+
+    def remove(self, work_batches):
+
+        with self.lock:
+            tracked = self.works.get(work_batches.work_id, [])
+            if work_batches in tracked:
+                tracked.remove(work_batches)
+            if len(tracked) == 0:
+                self.works.pop(work_batches.work_id, None)
+
+    def start(self):
+
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self.run, name='dlcs-batch-tracker')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+
+        interval = self.interval
+        while True:
+            if self.outstanding() == 0:
+                # sleep until new batches are tracked
+                self.wake.wait()
+                self.wake.clear()
+                interval = self.interval
+            finished = self.poll()
+            if len(finished) > 0:
+                interval = self.interval
+            else:
+                # back off while nothing is progressing
+                interval = min(interval * 2, self.max_interval)
+            if self.wake.wait(interval):
+                # newly tracked batches restart the polling schedule
+                interval = self.interval
+            self.wake.clear()
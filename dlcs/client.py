@@ -1,14 +1,117 @@
 from dlcs.queue_response import Batch
-from requests import post, auth
+from dlcs.image_collection import ImageCollection
+from requests import post, patch, auth
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+import json as json_module
+import logging
+import os
+import threading
+import requests
 import settings
 
 
+session = None
+session_pid = None
+session_lock = threading.Lock()
+
+
+class RegistrationError(Exception):
+
+    pass
+
+
+def get_session():
+
+    global session, session_pid
+
+    # pooled keep-alive session, rebuilt in forked worker processes
+    with session_lock:
+        if session is None or session_pid != os.getpid():
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.DLCS_REGISTER_CONCURRENCY)
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session_pid = os.getpid()
+        return session
+
+
 def register_collection(image_collection):
 
     authorisation = auth.HTTPBasicAuth(settings.DLCS_API_KEY, settings.DLCS_API_SECRET)
     url = settings.DLCS_ENTRY + 'customers/' + str(settings.DLCS_CUSTOMER_ID) + '/queue'
-    json = image_collection.as_json()
-    response = post(url, data=json, auth=authorisation)
+    response = post(url, data=get_request_body(image_collection), auth=authorisation)
     batch = Batch(response.json())
 
     return batch
+
+
+def register_collection_in_batches(image_collection, batch_size=None):
+
+    # split the collection into queue requests of batch_size images and post them concurrently
+    if batch_size is None:
+        batch_size = settings.DLCS_REGISTER_BATCH_SIZE
+    members = image_collection.members or []
+    chunks = [ImageCollection(members[start:start + batch_size]) for start in range(0, len(members), batch_size)]
+    if len(chunks) == 0:
+        return []
+
+    executor = ThreadPoolExecutor(max_workers=min(settings.DLCS_REGISTER_CONCURRENCY, len(chunks)))
+    try:
+        futures = [executor.submit(post_queue_request, chunk) for chunk in chunks]
+    finally:
+        executor.shutdown()
+
+    # any failed chunk fails the whole collection, once every chunk has been tried
+    batches = []
+    errors = []
+    for future in futures:
+        try:
+            batches.append(future.result())
+        except RegistrationError as e:
+            errors.append(str(e))
+    if len(errors) > 0:
+        raise RegistrationError("%d of %d queue requests failed, first: %s" % (len(errors), len(chunks), errors[0]))
+    return batches
+
+
+def post_queue_request(image_collection):
+
+    authorisation = auth.HTTPBasicAuth(settings.DLCS_API_KEY, settings.DLCS_API_SECRET)
+    url = settings.DLCS_ENTRY + 'customers/' + str(settings.DLCS_CUSTOMER_ID) + '/queue'
+    description = "batch of %d images" % (image_collection.total_items,)
+    try:
+        response = get_session().post(url, data=get_request_body(image_collection), auth=authorisation)
+    except Exception as e:
+        # chunked request bodies can fail with urllib3 and socket errors that requests does not wrap
+        logging.exception("Error posting " + description)
+        raise RegistrationError("Error posting %s: %r" % (description, e))
+    if response.status_code not in (200, 201, 202):
+        logging.error("Error posting %s: %s" % (description, response.status_code))
+        raise RegistrationError("Error posting %s: %s" % (description, response.status_code))
+    return Batch(response.json())
+
+
+def get_request_body(image_collection):
+
+    # a generator body is sent with chunked transfer encoding
+    if settings.DLCS_STREAM_REQUEST_BODIES:
+        return image_collection.iter_json()
+    return image_collection.as_json()
+
+
+def patch_image(image_id, data):
+
+    authorisation = auth.HTTPBasicAuth(settings.DLCS_API_KEY, settings.DLCS_API_SECRET)
+    response = patch(get_image_url(image_id), data=json_module.dumps(data), auth=authorisation)
+    return response.status_code == 200
+
+
+def get_image_url(image_id):
+
+    if image_id.startswith('http'):
+        return image_id
+    # bare ids or customer/space/id paths
+    image_name = image_id.rsplit('/', 1)[-1]
+    return settings.DLCS_ENTRY + 'customers/' + str(settings.DLCS_CUSTOMER_ID) + '/spaces/' + \
+        str(settings.CURRENT_SPACE) + '/images/' + image_name
@@ -3,6 +3,8 @@ import json
 
 class JSONLDBase(object):
 
+    __slots__ = ('context', 'at_id', 'id', 'type')
+
     def __init__(self):
 
         self.context = None
@@ -28,6 +30,8 @@ class JSONLDBase(object):
 
 class JSONLDBaseWithHydraContext(JSONLDBase):
 
+    __slots__ = ('include_context',)
+
     def __init__(self):
 
         super(JSONLDBaseWithHydraContext, self).__init__()
@@ -47,6 +51,8 @@ class JSONLDBaseWithHydraContext(JSONLDBase):
 
 class ImageCollection(JSONLDBaseWithHydraContext):
 
+    __slots__ = ('members',)
+
     def __init__(self, images=None):
 
         super(ImageCollection, self).__init__()
@@ -70,9 +76,48 @@ class ImageCollection(JSONLDBaseWithHydraContext):
 
         return data
 
+    def iter_json(self, chunk_size=64 * 1024):
+
+        # yields the same document as as_json in chunks, serialising one member at a time so the full
+        # list of member dictionaries and the complete string never exist at once
+        data = super(ImageCollection, self).to_json_dict()
+        # a placeholder keeps 'member' at the position it has in to_json_dict's output
+        data['member'] = None
+        data['total_items'] = self.total_items
+
+        buffer_parts = ['{']
+        buffer_size = 1
+        first_key = True
+        for key, value in data.items():
+            prefix = '' if first_key else ', '
+            first_key = False
+            if key != 'member':
+                part = prefix + json.dumps(key) + ': ' + json.dumps(value)
+                buffer_parts.append(part)
+                buffer_size += len(part)
+                continue
+            part = prefix + json.dumps(key) + ': ['
+            buffer_parts.append(part)
+            buffer_size += len(part)
+            for index, member in enumerate(self.members or []):
+                part = json.dumps(member.to_json_dict())
+                if index > 0:
+                    part = ', ' + part
+                buffer_parts.append(part)
+                buffer_size += len(part)
+                if buffer_size >= chunk_size:
+                    yield ''.join(buffer_parts)
+                    buffer_parts = []
+                    buffer_size = 0
+            buffer_parts.append(']')
+        buffer_parts.append('}')
+        yield ''.join(buffer_parts)
+
 
 class Image(JSONLDBase):
 
+    __slots__ = ('space', 'origin', 'tags', 'string_1', 'string_2', 'number_1', 'number_2')
+
     def __init__(self, id=None, at_id=None, space=None, origin=None, tags=None, string_1=None, string_2=None, number_1=None, number_2=None):
         super(Image, self).__init__()
         self.id = id
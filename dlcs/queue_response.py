@@ -21,14 +21,19 @@ class Batch:
     def __init__(self, batch_data):
 
         self.id = None
-        self.update_data(batch_data)
         self.count = 0
-        self.completed = False
+        self.completed = 0
+        self.errors = 0
+        self.finished = None
+        self.update_data(batch_data)
 
-    def update(self):
+    def update(self, session=None):
         url = self.id
         a = auth.HTTPBasicAuth(settings.DLCS_API_KEY, settings.DLCS_API_SECRET)
-        response = get(url, auth=a)
+        if session is None:
+            response = get(url, auth=a)
+        else:
+            response = session.get(url, auth=a)
         self.update_data(response.json())
 
     def update_data(self, batch_data):
@@ -38,4 +43,6 @@ class Batch:
             setattr(self, self.get_attribute_name(element), value)
 
     def is_completed(self):
-        return self.count == self.completed
+        if self.finished:
+            return True
+        return self.completed + self.errors >= self.count
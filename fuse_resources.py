@@ -0,0 +1,116 @@
+import importlib
+import logging
+import os
+import threading
+import boto3
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+from circuit_breaker import CircuitBreaker
+import settings
+
+
+class FuseResources(object):
+
+    def __init__(self):
+
+        # boto3 clients are thread safe, so one client (and its connection pool) serves every request thread
+        self.pid = os.getpid()
+        s3_config = Config(max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+                           retries={'max_attempts': settings.S3_MAX_ATTEMPTS},
+                           connect_timeout=settings.S3_CONNECT_TIMEOUT,
+                           read_timeout=settings.S3_TIMEOUT)
+        self.s3_client = boto3.client('s3', config=s3_config)
+
+        retry = Retry(total=settings.DLCS_RETRIES,
+                      backoff_factor=settings.DLCS_RETRY_BACKOFF,
+                      status_forcelist=[500, 502, 503, 504])
+        self.dlcs_adapter = HTTPAdapter(pool_connections=settings.DLCS_POOL_CONNECTIONS,
+                                        pool_maxsize=settings.DLCS_POOL_MAXSIZE,
+                                        max_retries=retry)
+        self.dlcs_session = requests.Session()
+        self.dlcs_session.mount('http://', self.dlcs_adapter)
+        self.dlcs_session.mount('https://', self.dlcs_adapter)
+        self.dlcs_breaker = CircuitBreaker('DLCS', settings.DLCS_BREAKER_FAILURES, settings.DLCS_BREAKER_RESET_SECONDS)
+
+        p_ = importlib.import_module(settings.PARSER_PATH)
+        self.parser = p_.Parser(space=settings.CURRENT_SPACE)
+
+        # used to issue the S3 and DLCS fetches for a request concurrently
+        self.executor = ThreadPoolExecutor(max_workers=settings.FUSE_FETCH_WORKERS)
+        # syncing the metadata index queues a fetch per changed work, so it must not share the request pool
+        self.sync_executor = ThreadPoolExecutor(max_workers=settings.WORK_INDEX_SYNC_WORKERS)
+        # background refreshes wait on fetches of their own, so they get a separate, smaller pool
+        self.refresh_executor = ThreadPoolExecutor(max_workers=settings.MANIFEST_REFRESH_WORKERS)
+
+    def warm_up(self):
+
+        # open connections ahead of the first request so it does not pay the TLS handshakes
+        try:
+            self.s3_client.head_bucket(Bucket=settings.META_S3)
+        except Exception:
+            logging.exception("Could not warm up S3 connection")
+        try:
+            self.dlcs_session.head(settings.DLCS_ENTRY)
+        except Exception:
+            logging.exception("Could not warm up DLCS connection")
+        logging.debug("Resources warmed up for process %s: %s" % (self.pid, self.pool_stats()))
+
+    def pool_stats(self):
+
+        return {
+            'dlcs': get_pool_manager_stats(self.dlcs_adapter.poolmanager),
+            's3': get_pool_manager_stats(get_s3_pool_manager(self.s3_client)),
+        }
+
+
+def get_s3_pool_manager(s3_client):
+
+    # botocore does not expose its urllib3 pool manager publicly
+    try:
+        return s3_client._endpoint.http_session._manager
+    except AttributeError:
+        return None
+
+
+def get_pool_manager_stats(pool_manager):
+
+    stats = {
+        'pools': 0,
+        'connections_opened': 0,
+        'requests': 0,
+        'idle_connections': 0,
+        'max_connections': 0,
+    }
+    if pool_manager is None:
+        return stats
+    for key in pool_manager.pools.keys():
+        pool = pool_manager.pools.get(key)
+        if pool is None:
+            continue
+        stats['pools'] += 1
+        stats['connections_opened'] += pool.num_connections
+        stats['requests'] += pool.num_requests
+        stats['idle_connections'] += sum(1 for connection in list(pool.pool.queue) if connection is not None)
+        stats['max_connections'] += pool.pool.maxsize
+    return stats
+
+
+resources = None
+resources_lock = threading.Lock()
+
+
+def get_resources():
+
+    global resources
+
+    # uWSGI forks workers from the master, so resources are rebuilt in each worker process
+    current = resources
+    if current is not None and current.pid == os.getpid():
+        return current
+    with resources_lock:
+        if resources is None or resources.pid != os.getpid():
+            resources = FuseResources()
+        return resources
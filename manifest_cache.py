@@ -0,0 +1,203 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from manifest_response import compress_body
+
+
+class CacheEntry(object):
+
+    def __init__(self, reference, body, base_url=None, last_modified=None, s3_etag=None, dlcs_etag=None,
+                 dlcs_digest=None, validated=None):
+
+        self.reference = reference
+        if isinstance(body, unicode):
+            body = body.encode('utf-8')
+        self.body = body  # serialised, fully decorated manifest
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.encodings = compress_body(body)  # precompressed bodies keyed by content coding
+        self.base_url = base_url
+        self.last_modified = last_modified  # seconds since the epoch
+        self.s3_etag = s3_etag
+        self.dlcs_etag = dlcs_etag
+        self.dlcs_digest = dlcs_digest
+        self.validated = validated
+        if self.validated is None:
+            self.validated = time.time()
+
+    @property
+    def size(self):
+
+        return len(self.body) + sum(len(encoded) for encoded in self.encodings.values())
+
+    def is_fresh(self, max_age):
+
+        return time.time() - self.validated < max_age
+
+    def touch(self):
+
+        self.validated = time.time()
+
+    def to_json_dict(self):
+
+        return {
+            'reference': self.reference,
+            'body': self.body,
+            'base_url': self.base_url,
+            'last_modified': self.last_modified,
+            's3_etag': self.s3_etag,
+            'dlcs_etag': self.dlcs_etag,
+            'dlcs_digest': self.dlcs_digest,
+            'validated': self.validated,
+        }
+
+    @staticmethod
+    def from_json_dict(data):
+
+        return CacheEntry(data.get('reference'), data.get('body'),
+                          base_url=data.get('base_url'),
+                          last_modified=data.get('last_modified'),
+                          s3_etag=data.get('s3_etag'),
+                          dlcs_etag=data.get('dlcs_etag'),
+                          dlcs_digest=data.get('dlcs_digest'),
+                          validated=data.get('validated'))
+
+
+class ManifestCache(object):
+
+    def __init__(self, max_bytes, disk_path=None):
+
+        self.max_bytes = max_bytes
+        self.disk_path = disk_path
+        self.entries = OrderedDict()
+        self.current_bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, reference):
+
+        with self.lock:
+            entry = self.entries.pop(reference, None)
+            if entry is not None:
+                if self.disk_path is not None and not os.path.exists(
+                        get_shared_entry_filename(self.disk_path, reference)):
+                    # shared entry removed by ingest, so the work has been rewritten
+                    self.current_bytes -= entry.size
+                    self.invalidations += 1
+                    self.misses += 1
+                    return None
+                # re-insert to mark as most recently used
+                self.entries[reference] = entry
+                self.hits += 1
+                return entry
+
+        entry = self.read_disk_entry(reference)
+        with self.lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self.add_entry(entry)
+        return entry
+
+    def put(self, entry):
+
+        with self.lock:
+            self.add_entry(entry)
+        self.write_disk_entry(entry)
+
+    def invalidate(self, reference):
+
+        with self.lock:
+            entry = self.entries.pop(reference, None)
+            if entry is not None:
+                self.current_bytes -= entry.size
+            self.invalidations += 1
+        remove_shared_entry(self.disk_path, reference)
+
+    def stats(self):
+
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+    # must be called with the lock held
+    def add_entry(self, entry):
+
+        existing = self.entries.pop(entry.reference, None)
+        if existing is not None:
+            self.current_bytes -= existing.size
+        if entry.size > self.max_bytes:
+            return
+        self.entries[entry.reference] = entry
+        self.current_bytes += entry.size
+        while self.current_bytes > self.max_bytes:
+            reference, evicted = self.entries.popitem(last=False)
+            self.current_bytes -= evicted.size
+            self.evictions += 1
+            logging.debug("Evicted cached manifest for %s" % (reference,))
+
+    def read_disk_entry(self, reference):
+
+        if self.disk_path is None:
+            return None
+        filename = get_shared_entry_filename(self.disk_path, reference)
+        try:
+            with open(filename, 'rb') as entry_file:
+                return CacheEntry.from_json_dict(json.load(entry_file))
+        except IOError:
+            return None
+        except ValueError:
+            logging.exception("Discarding unreadable cache entry %s" % (filename,))
+            remove_shared_entry(self.disk_path, reference)
+            return None
+
+    def write_disk_entry(self, entry):
+
+        if self.disk_path is None:
+            return
+        filename = get_shared_entry_filename(self.disk_path, entry.reference)
+        # write to a temporary file and rename so other workers never read a partial entry
+        tmp_filename = filename + '.' + str(uuid.uuid4())
+        try:
+            with open(tmp_filename, 'wb') as entry_file:
+                json.dump(entry.to_json_dict(), entry_file)
+            os.rename(tmp_filename, filename)
+        except (IOError, OSError):
+            logging.exception("Could not write cache entry %s" % (filename,))
+
+
+def get_digest(content):
+
+    return hashlib.sha1(content).hexdigest()
+
+
+def get_shared_entry_filename(disk_path, reference):
+
+    return os.path.join(disk_path, 'manifest-' + hashlib.sha1(reference).hexdigest() + '.json')
+
+
+def remove_shared_entry(disk_path, reference):
+
+    if disk_path is None:
+        return
+    try:
+        os.remove(get_shared_entry_filename(disk_path, reference))
+    except OSError:
+        pass
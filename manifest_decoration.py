@@ -0,0 +1,97 @@
+import json
+from collections import OrderedDict
+
+
+def load_manifest(manifest_string):
+
+    # parses a dlcs manifest keeping the order of its top-level keys, so @context stays first in the served document.
+    # Nested objects are plain dicts, as ordering every object would make parsing several times slower.
+    last_pairs = []
+
+    def keep_pairs(pairs):
+        # objects are completed innermost first, so the last one is the document itself
+        last_pairs[:] = [pairs]
+        return dict(pairs)
+
+    manifest = json.loads(manifest_string, object_pairs_hook=keep_pairs)
+    if not isinstance(manifest, dict):
+        return manifest
+    return OrderedDict(last_pairs[0])
+
+
+class WorkIndex(object):
+
+    # lookup tables derived once from a work's stored metadata, so decorating a manifest is a single
+    # traversal of its canvases with constant-time lookups per canvas
+
+    def __init__(self, data):
+
+        self.meta = data['meta']
+        self.toc = data.get('toc')
+
+        canvas_label_field = None
+        flags = data.get('flags')
+        if flags is not None:
+            canvas_label_field = flags.get('Canvas_Label_Field')
+
+        image_metadata = data.get('image_metadata') or {}
+        size = 0
+        if len(image_metadata) > 0:
+            size = max(int(image_index) for image_index in image_metadata) + 1
+        self.image_metadata = [None] * size
+        self.canvas_labels = [None] * size
+        for image_index_string, metadata in image_metadata.items():
+            image_index = int(image_index_string)
+            self.image_metadata[image_index] = metadata
+            if canvas_label_field is None:
+                self.canvas_labels[image_index] = str(image_index + 1)
+            else:
+                # the last metadata entry for the label field wins
+                page = ""
+                for entry in metadata:
+                    if entry.get('label') == canvas_label_field:
+                        value = entry.get('value')
+                        if value is not None:
+                            page = value
+                self.canvas_labels[image_index] = page
+
+
+def decorate_manifest(work_index, manifest, manifest_url, range_base_url):
+
+    # rewrites ids and applies metadata, canvas labels and TOC ranges in one pass over the canvases
+    work_id = manifest_url.replace('.manifest', '')
+    manifest['@id'] = work_id
+    sequence = manifest['sequences'][0]
+    sequence['@id'] = work_id + '/sequences/0'
+
+    canvas_prefix = work_id + '/canvas/'
+    image_metadata = work_index.image_metadata
+    canvas_labels = work_index.canvas_labels
+    decorated_count = len(image_metadata)
+    canvas_ids = []
+    for canvas_index, canvas in enumerate(sequence['canvases']):
+        canvas_id = canvas_prefix + str(canvas_index)
+        canvas_ids.append(canvas_id)
+        canvas['@id'] = canvas_id
+        for image in canvas['images']:
+            image['on'] = canvas_id
+        if canvas_index < decorated_count:
+            metadata = image_metadata[canvas_index]
+            if metadata is not None:
+                canvas['metadata'] = metadata
+                canvas['label'] = canvas_labels[canvas_index]
+
+    manifest['metadata'] = work_index.meta
+
+    toc = work_index.toc
+    if toc is not None:
+        canvas_count = len(canvas_ids)
+        structures = []
+        for r, (entry, image_indexes) in enumerate(toc.items()):
+            structures.append({
+                '@type': 'sc:Range',
+                '@id': range_base_url + '/range/r-' + str(r),
+                'label': entry,
+                # images not yet present in the dlcs manifest are left out of the range
+                'canvases': [canvas_ids[i] for i in image_indexes if i < canvas_count]})
+        manifest['structures'] = structures
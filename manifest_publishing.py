@@ -0,0 +1,71 @@
+import json
+import logging
+from requests import get
+from manifest_cache import get_digest
+from manifest_decoration import WorkIndex, decorate_manifest, load_manifest
+from metadata_encoding import decode_work_data
+from manifest_response import MANIFEST_CONTENT_TYPE
+import settings
+
+# user metadata stored with each published manifest, used by fuse to revalidate it
+WORK_ETAG_METADATA_KEY = 'work-etag'
+DLCS_DIGEST_METADATA_KEY = 'dlcs-digest'
+DLCS_ETAG_METADATA_KEY = 'dlcs-etag'
+MANIFEST_URL_METADATA_KEY = 'manifest-url'
+
+
+def get_published_manifest_key(work_id):
+
+    return 'manifest-' + str(work_id)
+
+
+def get_public_manifest_url(work_id):
+
+    return settings.PUBLIC_BASE_URL.rstrip('/') + '/work/' + str(work_id) + '.manifest'
+
+
+def publish_manifest(s3_client, parser, work_id):
+
+    # builds the manifest exactly as fuse would for a request to the public url, and stores it in S3
+    obj = s3_client.get_object(Bucket=settings.META_S3, Key='work-' + str(work_id))
+    data = decode_work_data(obj['Body'].read())
+
+    response = get(parser.get_manifest_path_from_reference(work_id), timeout=settings.DLCS_TIMEOUT)
+    if response.status_code != 200:
+        logging.error("Could not obtain manifest to publish for work %s" % (work_id,))
+        return False
+    manifest = load_manifest(response.text)
+
+    manifest_url = get_public_manifest_url(work_id)
+    decorate_manifest(WorkIndex(data), manifest, manifest_url, manifest_url)
+    parser.custom_decoration(data, manifest)
+
+    metadata = {
+        WORK_ETAG_METADATA_KEY: obj['ETag'],
+        DLCS_DIGEST_METADATA_KEY: get_digest(response.content),
+        MANIFEST_URL_METADATA_KEY: manifest_url,
+    }
+    if response.headers.get('ETag') is not None:
+        # lets fuse revalidate against dlcs with a conditional request instead of fetching the manifest
+        metadata[DLCS_ETAG_METADATA_KEY] = response.headers['ETag']
+    s3_client.put_object(Bucket=settings.PUBLISHED_MANIFEST_S3,
+                         Key=get_published_manifest_key(work_id),
+                         Body=json.dumps(manifest),
+                         ContentType=MANIFEST_CONTENT_TYPE,
+                         Metadata=metadata)
+    logging.info("Published manifest for work %s" % (work_id,))
+    return True
+
+
+def load_published_manifest(s3_client, work_id):
+
+    # returns the stored object, or None when the work has no published manifest
+    try:
+        return s3_client.get_object(Bucket=settings.PUBLISHED_MANIFEST_S3, Key=get_published_manifest_key(work_id))
+    except s3_client.exceptions.NoSuchKey:
+        return None
+
+
+def remove_published_manifest(s3_client, work_id):
+
+    s3_client.delete_object(Bucket=settings.PUBLISHED_MANIFEST_S3, Key=get_published_manifest_key(work_id))
@@ -0,0 +1,126 @@
+import calendar
+import zlib
+from email.utils import formatdate, parsedate_tz, mktime_tz
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+import settings
+
+MANIFEST_CONTENT_TYPE = 'application/ld+json; charset=utf-8'
+STALE_WARNING = '110 - "Response is Stale"'
+
+
+def compress_body(body):
+
+    encodings = {}
+    if len(body) < settings.MANIFEST_COMPRESSION_MIN_BYTES:
+        return encodings
+    # wbits of 16 + MAX_WBITS produces a gzip header and trailer
+    compressor = zlib.compressobj(settings.MANIFEST_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    encodings['gzip'] = compressor.compress(body) + compressor.flush()
+    if brotli is not None:
+        encodings['br'] = brotli.compress(body, mode=brotli.MODE_TEXT)
+    return encodings
+
+
+def get_http_date(timestamp):
+
+    return formatdate(timestamp, usegmt=True)
+
+
+def get_timestamp(value):
+
+    # accepts datetimes (as returned by boto) or HTTP date strings (as sent by DLCS and clients)
+    if value is None:
+        return None
+    if hasattr(value, 'utctimetuple'):
+        return calendar.timegm(value.utctimetuple())
+    parsed = parsedate_tz(value)
+    if parsed is None:
+        return None
+    return mktime_tz(parsed)
+
+
+def get_representation_etag(entry, encoding):
+
+    if encoding is None:
+        return '"%s"' % (entry.etag,)
+    return '"%s-%s"' % (entry.etag, encoding)
+
+
+def choose_encoding(entry, accept_encoding):
+
+    if accept_encoding is None:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(','):
+        pieces = part.strip().split(';')
+        coding = pieces[0].strip().lower()
+        quality = 1.0
+        for param in pieces[1:]:
+            param = param.strip()
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        accepted[coding] = quality
+    # prefer brotli over gzip when both are available and acceptable
+    for coding in ['br', 'gzip']:
+        if coding not in entry.encodings:
+            continue
+        quality = accepted.get(coding, accepted.get('*', 0.0))
+        if quality > 0:
+            return coding
+    return None
+
+
+def is_not_modified(entry, if_none_match, if_modified_since):
+
+    if if_none_match is not None:
+        if if_none_match.strip() == '*':
+            return True
+        representation_etags = [get_representation_etag(entry, None)]
+        for encoding in entry.encodings:
+            representation_etags.append(get_representation_etag(entry, encoding))
+        for tag in if_none_match.split(','):
+            tag = tag.strip()
+            if tag.startswith('W/'):
+                tag = tag[2:]
+            if tag in representation_etags:
+                return True
+        # If-Modified-Since is ignored when If-None-Match is present
+        return False
+
+    if if_modified_since is not None and entry.last_modified is not None:
+        since = get_timestamp(if_modified_since)
+        if since is not None and int(entry.last_modified) <= since:
+            return True
+    return False
+
+
+def build_manifest_response(entry, request_headers, stale=False):
+
+    encoding = choose_encoding(entry, request_headers.get('Accept-Encoding'))
+    headers = {
+        'Content-Type': MANIFEST_CONTENT_TYPE,
+        'ETag': get_representation_etag(entry, encoding),
+        'Cache-Control': settings.MANIFEST_CACHE_CONTROL,
+        'Vary': 'Accept-Encoding',
+    }
+    if stale:
+        # not confirmed current, so downstream caches should not hold it for long
+        headers['Cache-Control'] = settings.MANIFEST_STALE_CACHE_CONTROL
+        headers['Warning'] = STALE_WARNING
+    if entry.last_modified is not None:
+        headers['Last-Modified'] = get_http_date(entry.last_modified)
+
+    if is_not_modified(entry, request_headers.get('If-None-Match'), request_headers.get('If-Modified-Since')):
+        return '', 304, headers
+
+    if encoding is None:
+        return entry.body, 200, headers
+    headers['Content-Encoding'] = encoding
+    return entry.encodings[encoding], 200, headers
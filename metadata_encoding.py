@@ -0,0 +1,84 @@
+import json
+import zlib
+from collections import OrderedDict
+
+# stored work metadata is either the original JSON document or a compact encoding: this prefix, a version byte
+# and a zlib compressed JSON body holding the TOC as ordered pairs and the image metadata as a label dictionary,
+# a table of label sequences and one row of values per image
+COMPACT_PREFIX = 'WMD'
+COMPACT_VERSION = 1
+
+JSON_FORMAT = 'json'
+COMPACT_FORMAT = 'compact'
+
+
+def encode_work_data(data, encoding_format=COMPACT_FORMAT, level=6):
+
+    if encoding_format == JSON_FORMAT:
+        return json.dumps(data)
+    compact = dict(data)
+    if 'toc' in data:
+        compact['toc'] = data['toc'].items()
+    if 'image_metadata' in data:
+        compact['image_metadata'] = encode_image_metadata(data['image_metadata'])
+    body = json.dumps(compact, separators=(',', ':'))
+    return COMPACT_PREFIX + chr(COMPACT_VERSION) + zlib.compress(body, level)
+
+
+def decode_work_data(body):
+
+    # accepts either format, JSON documents keeping the order of their keys as before
+    if not body.startswith(COMPACT_PREFIX):
+        return json.loads(body, object_pairs_hook=OrderedDict)
+    version = ord(body[len(COMPACT_PREFIX)])
+    if version != COMPACT_VERSION:
+        raise ValueError("Unsupported work metadata version %d" % (version,))
+    data = json.loads(zlib.decompress(body[len(COMPACT_PREFIX) + 1:]))
+    if 'toc' in data:
+        data['toc'] = OrderedDict(data['toc'])
+    if 'image_metadata' in data:
+        data['image_metadata'] = decode_image_metadata(data['image_metadata'])
+    return data
+
+
+def encode_image_metadata(image_metadata):
+
+    labels = []
+    label_indexes = {}
+    shapes = []
+    shape_indexes = {}
+    rows = []
+    for image_index, entries in sorted(image_metadata.items(), key=lambda item: int(item[0])):
+        shape = []
+        row = [int(image_index), None]
+        for entry in entries:
+            if len(entry) != 2 or 'label' not in entry or 'value' not in entry:
+                # not a plain list of labelled values, keep it as it is
+                return image_metadata
+            label_index = label_indexes.get(entry['label'])
+            if label_index is None:
+                label_index = label_indexes[entry['label']] = len(labels)
+                labels.append(entry['label'])
+            shape.append(label_index)
+            row.append(entry['value'])
+        shape = tuple(shape)
+        shape_index = shape_indexes.get(shape)
+        if shape_index is None:
+            shape_index = shape_indexes[shape] = len(shapes)
+            shapes.append(shape)
+        row[1] = shape_index
+        rows.append(row)
+    return {'labels': labels, 'shapes': shapes, 'rows': rows}
+
+
+def decode_image_metadata(encoded):
+
+    if 'rows' not in encoded:
+        return encoded
+    labels = encoded['labels']
+    shapes = [[labels[label_index] for label_index in shape] for shape in encoded['shapes']]
+    image_metadata = {}
+    for row in encoded['rows']:
+        image_metadata[str(row[0])] = [{'label': label, 'value': value}
+                                       for label, value in zip(shapes[row[1]], row[2:])]
+    return image_metadata
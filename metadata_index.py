@@ -0,0 +1,354 @@
+import argparse
+import boto3
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from manifest_response import get_timestamp
+from metadata_encoding import decode_work_data
+import settings
+
+TITLE_LABEL = 'Work Title'
+COLLECTION_LABEL = 'Collection'
+SERIES_LABEL = 'Series'
+DATE_LABEL = 'Date'
+
+# works written per transaction while syncing
+SYNC_BATCH_SIZE = 200
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS works (
+        id TEXT PRIMARY KEY,
+        etag TEXT,
+        last_modified INTEGER,
+        label TEXT,
+        collection TEXT,
+        series TEXT,
+        date TEXT,
+        body BLOB)''',
+    'CREATE INDEX IF NOT EXISTS works_collection ON works (collection, series)',
+    'CREATE INDEX IF NOT EXISTS works_date ON works (date)',
+    'CREATE TABLE IF NOT EXISTS state (name TEXT PRIMARY KEY, value REAL)',
+    'CREATE TABLE IF NOT EXISTS accesses (id TEXT PRIMARY KEY, hits INTEGER, last_access REAL)',
+]
+
+
+class MetadataIndex(object):
+
+    # local SQLite copy of the work-<id> objects in the metadata bucket, written by ingest as works are stored
+    # and synced from the bucket by fuse. The revision is bumped on every change so derived views can be cached.
+
+    def __init__(self, path):
+
+        self.path = path
+        self.local = threading.local()
+        self.sync_lock = threading.Lock()
+        self.sync_done = threading.Condition(self.sync_lock)
+        self.syncing = False
+
+    def get_connection(self):
+
+        # sqlite connections cannot be shared between threads or across a fork
+        connection = getattr(self.local, 'connection', None)
+        if connection is None or self.local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.text_factory = str
+            connection.execute('PRAGMA journal_mode=WAL')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            connection.commit()
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return connection
+
+    def get_work(self, work_id):
+
+        # returns (data, etag, last modified) or None when the work is not indexed
+        row = self.get_connection().execute('SELECT body, etag, last_modified FROM works WHERE id = ?',
+                                            (str(work_id),)).fetchone()
+        if row is None:
+            return None
+        return load_data(str(row[0])), row[1], row[2]
+
+    def put_work(self, work_id, etag, body, last_modified=None):
+
+        self.put_works([(work_id, etag, body, last_modified)])
+
+    def put_works(self, works):
+
+        # (work id, etag, body, last modified) tuples, written in a single transaction
+        rows = []
+        for work_id, etag, body, last_modified in works:
+            summary = get_summary(load_data(body))
+            if last_modified is None:
+                last_modified = int(time.time())
+            rows.append((str(work_id), etag, last_modified, summary['label'], summary['collection'],
+                         summary['series'], summary['date'], sqlite3.Binary(body)))
+        connection = self.get_connection()
+        with connection:
+            connection.executemany('INSERT OR REPLACE INTO works VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            bump_revision(connection)
+
+    def remove_work(self, work_id, unless_etag=None):
+
+        # with unless_etag, only an entry for a different version of the work is removed
+        connection = self.get_connection()
+        with connection:
+            if unless_etag is None:
+                cursor = connection.execute('DELETE FROM works WHERE id = ?', (str(work_id),))
+            else:
+                cursor = connection.execute('DELETE FROM works WHERE id = ? AND etag != ?',
+                                            (str(work_id), unless_etag))
+            if cursor.rowcount > 0:
+                bump_revision(connection)
+
+    def find_works(self, collection=None, series=None, date_from=None, date_to=None):
+
+        # summaries of the matching works, dates are compared as text so years or ISO dates work as bounds
+        clauses = []
+        parameters = []
+        for clause, value in (('collection = ?', collection), ('series = ?', series),
+                              ('date >= ?', date_from), ('date <= ?', date_to)):
+            if value is not None:
+                clauses.append(clause)
+                parameters.append(value)
+        query = 'SELECT id, label, collection, series, date FROM works'
+        if len(clauses) > 0:
+            query += ' WHERE ' + ' AND '.join(clauses)
+        rows = self.get_connection().execute(query + ' ORDER BY label, id', parameters).fetchall()
+        return [{'id': row[0], 'label': row[1], 'collection': row[2], 'series': row[3], 'date': row[4]}
+                for row in rows]
+
+    def get_collections(self):
+
+        # (collection, series, work count) for every grouping present in the index
+        return self.get_connection().execute(
+            'SELECT collection, series, COUNT(*) FROM works GROUP BY collection, series').fetchall()
+
+    def record_accesses(self, counts, now=None):
+
+        # adds {work id: requests} to the running totals, which do not affect the revision
+        if now is None:
+            now = time.time()
+        connection = self.get_connection()
+        with connection:
+            connection.executemany('INSERT OR IGNORE INTO accesses VALUES (?, 0, ?)',
+                                   [(str(work_id), now) for work_id in counts])
+            connection.executemany('UPDATE accesses SET hits = hits + ?, last_access = ? WHERE id = ?',
+                                   [(hits, now, str(work_id)) for work_id, hits in counts.items()])
+
+    def get_popular_works(self, limit):
+
+        # ids of indexed works by requests, most first, then by most recently stored for works never requested
+        rows = self.get_connection().execute(
+            'SELECT works.id FROM works LEFT JOIN accesses ON accesses.id = works.id '
+            'ORDER BY COALESCE(accesses.hits, 0) DESC, works.last_modified DESC, works.id LIMIT ?',
+            (limit,)).fetchall()
+        return [row[0] for row in rows]
+
+    def get_revision(self):
+
+        return int(self.get_state('revision') or 0)
+
+    def get_synced(self):
+
+        return self.get_state('synced')
+
+    def get_state(self, name):
+
+        row = self.get_connection().execute('SELECT value FROM state WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def is_stale(self, max_age):
+
+        synced = self.get_synced()
+        return synced is None or time.time() - synced > max_age
+
+    def sync(self, s3_client, bucket, executor, rebuild=False):
+
+        # brings the index in line with the bucket, fetching only objects whose ETag differs from the index
+        listed = {}
+        paginator = s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket, Prefix='work-'):
+            for obj in page.get('Contents', []):
+                listed[obj['Key'][len('work-'):]] = obj['ETag']
+
+        connection = self.get_connection()
+        if rebuild:
+            indexed = {}
+        else:
+            indexed = dict(connection.execute('SELECT id, etag FROM works').fetchall())
+        changed = [work_id for work_id, etag in listed.items() if indexed.get(work_id) != etag]
+        removed = [work_id for work_id in indexed if work_id not in listed]
+
+        def fetch(work_id):
+            try:
+                obj = s3_client.get_object(Bucket=bucket, Key='work-' + work_id)
+                return work_id, obj['ETag'], obj['Body'].read(), get_timestamp(obj.get('LastModified'))
+            except Exception:
+                logging.exception("Could not index work %s" % (work_id,))
+                return None
+
+        if rebuild or len(removed) > 0:
+            with connection:
+                if rebuild:
+                    connection.execute('DELETE FROM works')
+                connection.executemany('DELETE FROM works WHERE id = ?', [(work_id,) for work_id in removed])
+                bump_revision(connection)
+        fetched = []
+        for result in executor.map(fetch, changed):
+            if result is not None:
+                fetched.append(result)
+            if len(fetched) >= SYNC_BATCH_SIZE:
+                self.put_works(fetched)
+                fetched = []
+        if len(fetched) > 0:
+            self.put_works(fetched)
+        with connection:
+            connection.execute('INSERT OR REPLACE INTO state VALUES (?, ?)', ('synced', time.time()))
+        logging.info("Metadata index synced: %d works, %d fetched, %d removed" % (
+            len(listed), len(changed), len(removed)))
+
+    def sync_in_background(self, s3_client, bucket, executor):
+
+        with self.sync_lock:
+            if self.syncing:
+                return
+            self.syncing = True
+        synced = self.get_synced()
+
+        def run():
+            try:
+                self.sync_if_unchanged(s3_client, bucket, executor, synced)
+            except Exception:
+                logging.exception("Could not sync metadata index")
+            finally:
+                self.finish_sync()
+
+        thread = threading.Thread(target=run, name='metadata-index-sync')
+        thread.daemon = True
+        thread.start()
+
+    def sync_once(self, s3_client, bucket, executor):
+
+        # loads an index that has never been synced, joining a sync already in progress rather than starting another
+        with self.sync_lock:
+            while self.syncing:
+                self.sync_done.wait()
+            if self.get_synced() is not None:
+                return
+            self.syncing = True
+        try:
+            while not self.sync_if_unchanged(s3_client, bucket, executor, None):
+                if self.get_synced() is not None:
+                    return
+                # another process is loading the shared index
+                time.sleep(1)
+        finally:
+            self.finish_sync()
+
+    def sync_if_unchanged(self, s3_client, bucket, executor, synced):
+
+        # syncs unless another process holds the sync claim, returning False if so, and skips the sync when the
+        # index has been synced since synced was read
+        if not self.claim_sync():
+            logging.debug("Metadata index is being synced by another process")
+            return False
+        try:
+            if self.get_synced() == synced:
+                self.sync(s3_client, bucket, executor)
+        finally:
+            self.release_sync()
+        return True
+
+    def claim_sync(self):
+
+        # every process on the host shares the index file, so one of them syncs at a time. The claim is taken in a
+        # write transaction and lapses after WORK_INDEX_SYNC_CLAIM_SECONDS in case its holder died mid-sync.
+        now = time.time()
+        connection = self.get_connection()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            row = connection.execute('SELECT value FROM state WHERE name = ?', ('sync_claimed',)).fetchone()
+            if row is not None and now - row[0] < settings.WORK_INDEX_SYNC_CLAIM_SECONDS:
+                return False
+            connection.execute('INSERT OR REPLACE INTO state VALUES (?, ?)', ('sync_claimed', now))
+        return True
+
+    def release_sync(self):
+
+        connection = self.get_connection()
+        with connection:
+            connection.execute('DELETE FROM state WHERE name = ?', ('sync_claimed',))
+
+    def is_syncing(self):
+
+        # true while this process or another process sharing the index is syncing it
+        if self.syncing:
+            return True
+        claimed = self.get_state('sync_claimed')
+        return claimed is not None and time.time() - claimed < settings.WORK_INDEX_SYNC_CLAIM_SECONDS
+
+    def finish_sync(self):
+
+        with self.sync_lock:
+            self.syncing = False
+            self.sync_done.notify_all()
+
+
+def bump_revision(connection):
+
+    connection.execute('INSERT OR IGNORE INTO state VALUES (?, 0)', ('revision',))
+    connection.execute('UPDATE state SET value = value + 1 WHERE name = ?', ('revision',))
+
+
+def load_data(body):
+
+    return decode_work_data(body)
+
+
+def get_summary(data):
+
+    meta = data.get('meta') or []
+    return {
+        'label': get_metadata_value(meta, TITLE_LABEL),
+        'collection': get_metadata_value(meta, COLLECTION_LABEL),
+        'series': get_metadata_value(meta, SERIES_LABEL),
+        'date': get_metadata_value(meta, DATE_LABEL),
+    }
+
+
+def get_metadata_value(meta, label):
+
+    for entry in meta:
+        if entry.get('label') == label:
+            return entry.get('value')
+    return None
+
+
+def main():
+
+    arg_parser = argparse.ArgumentParser(description='Sync the local work metadata index from S3')
+    arg_parser.add_argument('--rebuild', action='store_true', help='discard the index and reload every work')
+    args = arg_parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    index = MetadataIndex(settings.WORK_INDEX_PATH)
+    if not index.claim_sync():
+        logging.error("The metadata index is being synced by another process")
+        sys.exit(1)
+    executor = ThreadPoolExecutor(settings.WORK_INDEX_SYNC_WORKERS)
+    try:
+        index.sync(boto3.client('s3'), settings.META_S3, executor, rebuild=args.rebuild)
+    finally:
+        index.release_sync()
+        executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
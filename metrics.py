@@ -0,0 +1,240 @@
+import bisect
+import logging
+import os
+import threading
+import time
+import uuid
+
+import settings
+
+# upper bounds in seconds of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+class Histogram(object):
+
+    __slots__ = ('buckets', 'counts', 'count', 'total')
+
+    def __init__(self, buckets):
+
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last count is the +Inf bucket
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def get_quantile(self, quantile):
+
+        # upper bound of the bucket holding the quantile, as precise as the buckets allow
+        if self.count == 0:
+            return None
+        rank = quantile * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count > 0:
+                if index < len(self.buckets):
+                    return self.buckets[index]
+                return float('inf')
+        return float('inf')
+
+
+class Registry(object):
+
+    # counters and histograms for this process, keyed by metric name and a sorted tuple of label pairs
+
+    def __init__(self):
+
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.help = {}
+        self.last_dump = time.time()
+
+    def increment(self, name, amount=1, **labels):
+
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(DEFAULT_BUCKETS)
+            histogram.observe(value)
+
+    def describe(self, name, help_text):
+
+        self.help[name] = help_text
+
+    def render(self, gauges=()):
+
+        # Prometheus text exposition format, gauges being (name, value, labels) computed by the caller
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, histogram.buckets, list(histogram.counts), histogram.count, histogram.total)
+                                for key, histogram in self.histograms.items())
+
+        described = set()
+
+        def add_header(name, metric_type):
+            if name in described:
+                return
+            described.add(name)
+            if name in self.help:
+                lines.append('# HELP %s %s' % (name, self.help[name]))
+            lines.append('# TYPE %s %s' % (name, metric_type))
+
+        for (name, labels), value in counters:
+            add_header(name, 'counter')
+            lines.append('%s%s %s' % (name, format_labels(labels), format_value(value)))
+        for (name, labels), buckets, bucket_counts, count, total in histograms:
+            add_header(name, 'histogram')
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + (float('inf'),), bucket_counts):
+                cumulative += bucket_count
+                bucket_labels = labels + (('le', format_value(bound)),)
+                lines.append('%s_bucket%s %d' % (name, format_labels(bucket_labels), cumulative))
+            lines.append('%s_sum%s %s' % (name, format_labels(labels), format_value(total)))
+            lines.append('%s_count%s %d' % (name, format_labels(labels), count))
+        # samples of a metric must be contiguous, the sort being stable keeps their order otherwise
+        for name, value, labels in sorted(gauges, key=lambda gauge: gauge[0]):
+            add_header(name, 'gauge')
+            lines.append('%s%s %s' % (name, format_labels(tuple(sorted(labels.items()))), format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+    def summarise(self):
+
+        # one line per histogram with count, mean and approximate p50 and p99, for logs
+        lines = []
+        with self.lock:
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                if histogram.count == 0:
+                    continue
+                lines.append('%s%s count=%d mean=%.3fs p50<=%ss p99<=%ss' % (
+                    name, format_labels(labels), histogram.count, histogram.total / histogram.count,
+                    format_value(histogram.get_quantile(0.5)), format_value(histogram.get_quantile(0.99))))
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append('%s%s %s' % (name, format_labels(labels), format_value(value)))
+        return lines
+
+    def dump_if_due(self, interval, path=None):
+
+        # logs a summary, and optionally writes the exposition text for a textfile collector, every interval
+        now = time.time()
+        with self.lock:
+            if now - self.last_dump < interval:
+                return False
+            self.last_dump = now
+        for line in self.summarise():
+            logging.info("Metrics %d: %s" % (os.getpid(), line))
+        if path:
+            write_text_file('%s.%d.prom' % (path, os.getpid()), self.render())
+        return True
+
+
+class Timer(object):
+
+    __slots__ = ('name', 'labels', 'start')
+
+    def __init__(self, name, labels):
+
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        registry.observe(self.name, time.time() - self.start, **self.labels)
+        return False
+
+
+class NullTimer(object):
+
+    __slots__ = ()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+registry = Registry()
+enabled = settings.METRICS_ENABLED
+
+
+def timer(name, **labels):
+
+    # with metrics disabled this costs a function call and returns a shared no-op context manager
+    if not enabled:
+        return NULL_TIMER
+    return Timer(name, labels)
+
+
+def increment(name, amount=1, **labels):
+
+    if enabled:
+        registry.increment(name, amount, **labels)
+
+
+def observe(name, value, **labels):
+
+    if enabled:
+        registry.observe(name, value, **labels)
+
+
+def describe(name, help_text):
+
+    registry.describe(name, help_text)
+
+
+def format_labels(labels):
+
+    if len(labels) == 0:
+        return ''
+    return '{%s}' % (','.join('%s="%s"' % (key, escape_label_value(value)) for key, value in labels),)
+
+
+def escape_label_value(value):
+
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_value(value):
+
+    if value is None:
+        return 'NaN'
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def write_text_file(path, text):
+
+    tmp_path = path + '.' + str(uuid.uuid4())
+    try:
+        with open(tmp_path, 'wb') as text_file:
+            text_file.write(text)
+        os.rename(tmp_path, path)
+    except (IOError, OSError):
+        logging.exception("Could not write metrics to %s" % (path,))
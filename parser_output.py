@@ -1,5 +1,3 @@
-
-
 class ParserResponse:
 
     def __init__(self):
@@ -18,7 +16,9 @@ class Collection:
         self.works = None  # list of works
 
 
-class Work:
+class Work(object):
+
+    __slots__ = ('id', 'label', 'work_metadata', 'image_collection', 'toc', 'image_metadata', 'flags')
 
     def __init__(self):
         self.id = None
@@ -26,5 +26,55 @@ class Work:
         self.work_metadata = None  # dictionary of string->string
         self.image_collection = None  # ImageCollection instance
         self.toc = None
-        self.image_metadata = None
+        self.image_metadata = None  # dictionary of image index->metadata list, or an ImageMetadata instance
         self.flags = None
+
+
+class ImageMetadata(object):
+
+    # per-image metadata held as one tuple of utf-8 values per image against a shared tuple of labels,
+    # expanded to the list of {'label', 'value'} dictionaries used in stored work metadata on access
+
+    __slots__ = ('labels', 'rows')
+
+    def __init__(self, labels=()):
+
+        self.labels = tuple(intern(label) for label in labels)
+        self.rows = []
+
+    def append(self, values):
+
+        # values are aligned with the labels, None where the image has no value
+        self.rows.append(tuple(values))
+
+    def __len__(self):
+
+        return len(self.rows)
+
+    def __iter__(self):
+
+        return iter(range(len(self.rows)))
+
+    def __contains__(self, index):
+
+        return 0 <= index < len(self.rows)
+
+    def __getitem__(self, index):
+
+        return [{'label': label, 'value': value.decode('utf-8')}
+                for label, value in zip(self.labels, self.rows[index]) if value is not None]
+
+    def keys(self):
+
+        return range(len(self.rows))
+
+    def items(self):
+
+        return [(index, self[index]) for index in range(len(self.rows))]
+
+    def to_json_dict(self):
+
+        data = {}
+        for index in range(len(self.rows)):
+            data[index] = self[index]
+        return data
@@ -6,14 +6,94 @@ DLCS_CUSTOMER_ID = 49
 DLCS_API_KEY = ''
 DLCS_API_SECRET = ''
 CURRENT_SPACE = 3
+DLCS_REGISTER_BATCH_SIZE = 250  # images per queue request
+DLCS_REGISTER_CONCURRENCY = 4
+DLCS_BATCH_POLL_INTERVAL = 5
+DLCS_BATCH_POLL_MAX_INTERVAL = 60
+DLCS_BATCH_MAX_AGE = 6 * 60 * 60  # seconds before unfinished batches are given up on and their images counted as failed
+DLCS_STREAM_REQUEST_BODIES = False  # stream queue and deleteImages collections as chunked request bodies; only enable once DLCS and any proxies in front of it accept chunked uploads
 NUM_POOL_WORKERS = 5
 MESSAGES_PER_FETCH = 10
+INGEST_POOL_TYPE = 'process'  # 'process' or 'thread'
+MESSAGES_PER_WORKER = 2  # messages held in flight per pool worker
+VISIBILITY_TIMEOUT = 120
+VISIBILITY_HEARTBEAT_INTERVAL = 60
+WORKER_STATS_INTERVAL = 300
+DELETE_FLUSH_INTERVAL = 5
+INGEST_STOP_WAIT_SECONDS = 600  # on a graceful stop, how long each worker waits for its works' DLCS batches
+METRICS_ENABLED = True  # per-stage timings, served by fuse at /metrics and logged by ingest workers
+METRICS_DUMP_INTERVAL = 300
+METRICS_DUMP_PATH = None  # prefix for per-process Prometheus text files, e.g. '/var/lib/node_exporter/waylon'
 
 SQS_REGION = ''
 INPUT_QUEUE = ''
+ERROR_QUEUE = ''  # dead-letter queue for failed messages, journalled locally when empty
+FAILURE_JOURNAL_PATH = '/tmp/waylon-failures.jsonl'
+
 META_S3 = ''
 TMP_PATH = '/tmp/'
+INGEST_INCREMENTAL = True  # diff re-ingested works against their stored metadata and registered images
+INGEST_STREAMING = True  # parse directly from the S3 object instead of a temporary file
+FORCE_REINGEST = False  # also enabled with waylon-ingest.py --force
+WORK_METADATA_FORMAT = 'compact'  # 'compact' or 'json', fuse reads either
+WORK_INDEX_PATH = 'waylon-works.db'  # local SQLite index of stored work metadata, rebuild with metadata_index.py --rebuild
+WORK_INDEX_SYNC_WORKERS = 20
+PUBLISH_MANIFESTS = False  # build and store each work's decorated manifest once its DLCS batches complete
+PUBLISHED_MANIFEST_S3 = ''
+PUBLIC_BASE_URL = ''  # url fuse is served at, e.g. 'https://iiif.example.org/', used for ids in published manifests
+
+# BULK INGEST (waylon-bulk-ingest.py):
+
+BULK_METADATA_WRITERS = 20  # threads writing work metadata to S3, --writers
+BULK_REGISTER_BATCH_SIZE = 1000  # images per DLCS queue request, --batch-size
+BULK_GROUP_IMAGES = 20000  # images gathered across works before registering and checkpointing, --group-images
+
+# FUSE:
+
+MANIFEST_CACHE_MAX_BYTES = 64 * 1024 * 1024
+MANIFEST_CACHE_PATH = None  # shared on-disk cache directory, e.g. '/var/cache/waylon'
+MANIFEST_CACHE_REVALIDATE_SECONDS = 30
+MANIFEST_CACHE_CONTROL = 'public, max-age=300'
+MANIFEST_STALE_WHILE_REVALIDATE_SECONDS = 300  # past revalidation, serve the cached manifest while refreshing it
+MANIFEST_STALE_IF_ERROR_SECONDS = 24 * 60 * 60  # serve the last good manifest this long while DLCS or S3 fails
+MANIFEST_STALE_CACHE_CONTROL = 'public, max-age=30'
+MANIFEST_REFRESH_WORKERS = 4
+MANIFEST_COMPRESSION_MIN_BYTES = 1024
+MANIFEST_GZIP_LEVEL = 6
+FUSE_WARM_UP = True
+FUSE_PREFETCH_WORKS = 0  # most requested works to build manifests for at startup, needs PUBLIC_BASE_URL
+FUSE_PREFETCH_SECONDS = 0  # repeat the prefetch this often, 0 for startup only
+FUSE_PREFETCH_CONCURRENCY = 4
+FUSE_ACCESS_FLUSH_SECONDS = 60  # how often request counts per work are added to the metadata index
+SERVE_PUBLISHED_MANIFESTS = False
+S3_MAX_POOL_CONNECTIONS = 20
+S3_MAX_ATTEMPTS = 3
+DLCS_POOL_CONNECTIONS = 4
+DLCS_POOL_MAXSIZE = 20
+DLCS_RETRIES = 2
+DLCS_RETRY_BACKOFF = 0.2
+FUSE_FETCH_WORKERS = 20
+S3_CONNECT_TIMEOUT = 2
+S3_TIMEOUT = 5
+DLCS_CONNECT_TIMEOUT = 2
+DLCS_TIMEOUT = 10
+DLCS_BREAKER_FAILURES = 5  # consecutive failed DLCS requests before failing fast
+DLCS_BREAKER_RESET_SECONDS = 30  # how often to let a trial request through while failing fast
+WORK_INDEX_SYNC_ON_START = True
+WORK_INDEX_SYNC_SECONDS = 600
+WORK_INDEX_SYNC_CLAIM_SECONDS = 30 * 60  # lets another process take over a sync not finished by then
+COLLECTION_CACHE_MAX_BYTES = 8 * 1024 * 1024
+COLLECTION_PAGE_SIZE = 100
+
+# FUSE ASYNC SERVER (waylon-fuse-async.py):
+
+ASYNC_PORT = 8080
+ASYNC_MAX_CONNECTIONS = 1000
+ASYNC_FETCH_WORKERS = 400
+ASYNC_POOL_CONNECTIONS = 100
 
 # CUSTOMER MODULE:
 
 PARSER_PATH = 'RCVS_parser'
+RCVS_RELATIVE = ''  # prefix of image origins
+DLCS_RESOURCE_ENTRY = 'http://dlcs.io/'  # named query host for iiif-resource and raw-resource
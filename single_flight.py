@@ -0,0 +1,69 @@
+import sys
+import threading
+
+
+class Flight(object):
+
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+
+    # concurrent calls for the same key share one execution of the function: the first caller runs it and the
+    # others wait for its result, or its exception, instead of repeating the work
+
+    def __init__(self):
+
+        self.lock = threading.Lock()
+        self.flights = {}
+
+    def do(self, key, function, *args):
+
+        # returns (result, shared), shared being True for callers that waited on another caller's flight
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error[0], flight.error[1], flight.error[2]
+            return flight.result, True
+
+        return self.run(key, flight, function, args), False
+
+    def do_in_background(self, executor, key, function, *args):
+
+        # starts a flight on the executor unless one is already running for the key, without waiting for it
+        with self.lock:
+            if key in self.flights:
+                return False
+            flight = self.flights[key] = Flight()
+        executor.submit(self.run, key, flight, function, args)
+        return True
+
+    def run(self, key, flight, function, args):
+
+        try:
+            flight.result = function(*args)
+        except Exception:
+            flight.error = sys.exc_info()
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
+        return flight.result
+
+    def in_flight(self):
+
+        with self.lock:
+            return len(self.flights)
@@ -0,0 +1,67 @@
+# Checks that the streamed request body ImageCollection.iter_json produces is the document as_json produces, e.g.
+#
+#   python tests/test_image_collection.py
+
+import imp
+import json
+import os
+import sys
+import unittest
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root)
+try:
+    import settings
+except ImportError:
+    # the dlcs package reads settings at import; a checkout without a settings.py uses the example values
+    settings = imp.load_source('settings', os.path.join(root, 'settings-example.py'))
+
+from dlcs.image_collection import Image, ImageCollection
+
+
+def get_collection(count):
+
+    images = [Image(space=3, origin=u'https://example.org/rcvs/0001/0001_%05d.jpg' % (index,), string_1='0001',
+                    number_1=0, number_2=index) for index in range(count)]
+    return ImageCollection(images)
+
+
+class IterJsonTest(unittest.TestCase):
+
+    def test_matches_as_json(self):
+
+        for count in [0, 1, 2, 10, 1000]:
+            collection = get_collection(count)
+            expected = collection.as_json()
+            for chunk_size in [1, 100, 64 * 1024]:
+                streamed = ''.join(collection.iter_json(chunk_size=chunk_size))
+                self.assertEqual(streamed, expected, 'iter_json differs from as_json for %d images, chunk size %d' %
+                                 (count, chunk_size))
+
+    def test_matches_as_json_for_optional_fields(self):
+
+        images = [
+            Image(id='img1', space=3, origin=u'https://example.org/rcvs/caf\xe9 "1".jpg', tags=['a', 'b'],
+                  string_1='0001', string_2='x', number_1=1, number_2=2),
+            Image(space=3, origin=u'https://example.org/rcvs/0001/0001_00002.jpg'),
+        ]
+        collection = ImageCollection(images)
+        self.assertEqual(''.join(collection.iter_json(chunk_size=1)), collection.as_json())
+
+    def test_chunks_respect_chunk_size(self):
+
+        chunks = list(get_collection(1000).iter_json(chunk_size=4096))
+        self.assertTrue(len(chunks) > 1)
+        # every chunk but the last is yielded as soon as it reaches chunk_size, so overshoots by under one member
+        for chunk in chunks[:-1]:
+            self.assertTrue(4096 <= len(chunk) < 4096 + 200)
+
+    def test_is_valid_json(self):
+
+        document = json.loads(''.join(get_collection(10).iter_json(chunk_size=1)))
+        self.assertEqual(document['total_items'], 10)
+        self.assertEqual([member['number2'] for member in document['member']], range(10))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,304 @@
+import argparse
+import hashlib
+import imp
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+import boto3
+import dlcs
+import dlcs.image_collection
+import settings
+
+ingest = imp.load_source('waylon_ingest', os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                       'waylon-ingest.py'))
+
+# groups are completed on the batch tracker thread, so the checkpoint and report are shared with it
+progress_lock = threading.Lock()
+
+
+class Source(object):
+
+    def __init__(self, name, etag, bucket=None, key=None, path=None):
+
+        self.name = name  # file name as seen by the parser, e.g. lib0001.txt
+        self.etag = etag
+        self.bucket = bucket
+        self.key = key
+        self.path = path
+
+    @property
+    def checkpoint_key(self):
+
+        if self.path is not None:
+            return self.path
+        return 's3://%s/%s' % (self.bucket, self.key)
+
+
+def main():
+
+    arg_parser = argparse.ArgumentParser(description='Bulk ingest of lib/arc files for backfills')
+    arg_parser.add_argument('source', help='s3://bucket/prefix or a local directory')
+    arg_parser.add_argument('--processes', type=int, default=settings.NUM_POOL_WORKERS,
+                            help='parser processes')
+    arg_parser.add_argument('--writers', type=int, default=settings.BULK_METADATA_WRITERS,
+                            help='threads writing work metadata to S3')
+    arg_parser.add_argument('--batch-size', type=int, default=settings.BULK_REGISTER_BATCH_SIZE,
+                            help='images per DLCS queue request')
+    arg_parser.add_argument('--group-images', type=int, default=settings.BULK_GROUP_IMAGES,
+                            help='images accumulated across works before registering and checkpointing')
+    arg_parser.add_argument('--checkpoint', default='waylon-bulk-checkpoint.json',
+                            help='file recording completed sources, used to resume')
+    arg_parser.add_argument('--skip-delete', action='store_true',
+                            help='do not remove existing DLCS images, for works never ingested before')
+    arg_parser.add_argument('--force', action='store_true',
+                            help='ingest files even if their content matches the last ingest of the work')
+    args = arg_parser.parse_args()
+
+    logging.basicConfig(filename="waylon-bulk-ingest.log",
+                        filemode='a',
+                        level=logging.DEBUG,
+                        format='%(asctime)s,%(msecs)d %(name)s %(levelname)s %(message)s', )
+    logging.getLogger('boto').setLevel(logging.ERROR)
+    logging.getLogger('botocore').setLevel(logging.ERROR)
+
+    ingest.init_worker()
+    checkpoint = load_checkpoint(args.checkpoint)
+    sources = [source for source in list_sources(args.source) if source.checkpoint_key not in checkpoint]
+    report = BulkReport()
+    logging.info("Bulk ingest of %d sources (%d already completed)" % (len(sources), len(checkpoint)))
+
+    parse_pool = Pool(processes=args.processes, initializer=ingest.init_worker)
+    write_pool = ThreadPool(processes=args.writers, initializer=ingest.init_worker)
+    group = IngestGroup()
+    try:
+        for source, works, error in parse_pool.imap_unordered(parse_source, sources):
+            if error is not None:
+                logging.error("Could not parse %s: %s" % (source.checkpoint_key, error))
+                report.failures += 1
+                continue
+            works = [work for work in works if args.force or
+                     ingest.get_ingested_source_etag(work.id) != source.etag]
+            if len(works) == 0:
+                with progress_lock:
+                    report.skipped += 1
+                    checkpoint[source.checkpoint_key] = source.etag
+                continue
+            group.add(source, works, write_pool)
+            if group.image_count >= args.group_images:
+                flush_group(group, checkpoint, args, report)
+                group = IngestGroup()
+        flush_group(group, checkpoint, args, report)
+        logging.info("Waiting for DLCS to process %d groups" % (ingest.batch_tracker.outstanding(),))
+        ingest.batch_tracker.wait()
+    finally:
+        parse_pool.close()
+        write_pool.close()
+        parse_pool.join()
+        write_pool.join()
+        with progress_lock:
+            save_checkpoint(args.checkpoint, checkpoint)
+
+    report.log()
+
+
+class IngestGroup(object):
+
+    numbers = itertools.count(1)
+
+    def __init__(self):
+
+        self.number = next(IngestGroup.numbers)
+        self.sources = []
+        self.works = []
+        self.metadata_writes = []
+        self.image_count = 0
+
+    def add(self, source, works, write_pool):
+
+        self.sources.append((source, works))
+        for work in works:
+            self.works.append(work)
+            self.image_count += work.image_collection.total_items
+            self.metadata_writes.append(write_pool.apply_async(ingest.store_work_metadata, (work,)))
+
+
+def flush_group(group, checkpoint, args, report):
+
+    if len(group.sources) == 0:
+        return
+    try:
+        for write in group.metadata_writes:
+            write.get()
+    except Exception:
+        logging.exception("Could not store the metadata of %d works from %d files" % (
+            len(group.works), len(group.sources)))
+        with progress_lock:
+            report.failures += len(group.sources)
+        return
+
+    if not args.skip_delete:
+        for work in group.works:
+            ingest.remove_existing_images(work, ingest.worker.parser)
+
+    # register the images of every work in the group through shared queue batches
+    images = []
+    for work in group.works:
+        images.extend(work.image_collection.members)
+    try:
+        batches = dlcs.client.register_collection_in_batches(dlcs.image_collection.ImageCollection(images),
+                                                             batch_size=args.batch_size)
+    except dlcs.client.RegistrationError:
+        # left unrecorded and out of the checkpoint, so the group's sources are ingested again on the next run
+        logging.exception("Could not register the images of %d works from %d files" % (
+            len(group.works), len(group.sources)))
+        with progress_lock:
+            report.failures += len(group.sources)
+        return
+
+    with progress_lock:
+        report.files += len(group.sources)
+        report.works += len(group.works)
+        report.images += len(images)
+        report.batches += len(batches)
+    logging.info("Bulk ingest group %d registered: %d files, %d works, %d images in %d batches" % (
+        group.number, len(group.sources), len(group.works), len(images), len(batches)))
+
+    # the sources are only recorded and checkpointed once DLCS has processed every image of the group
+    s3_client = ingest.worker.s3_client
+    ingest.batch_tracker.track('bulk-group-%d' % (group.number,), batches,
+                               on_complete=lambda status: complete_group(group, status, s3_client, checkpoint, args,
+                                                                         report))
+
+
+def complete_group(group, status, s3_client, checkpoint, args, report):
+
+    # works share the group's batches, so an error in any image leaves every source of the group to be ingested again
+    with progress_lock:
+        report.failed_images += status['errors']
+        if status['errors'] > 0:
+            logging.error("Bulk ingest group %d: %d of %d images failed in DLCS, not recording its %d files" % (
+                group.number, status['errors'], status['count'], len(group.sources)))
+            report.failures += len(group.sources)
+            return
+        for source, works in group.sources:
+            for work in works:
+                ingest.record_ingested_source_etag(work.id, source.etag, s3_client)
+            checkpoint[source.checkpoint_key] = source.etag
+        save_checkpoint(args.checkpoint, checkpoint)
+    logging.info("Bulk ingest group %d done" % (group.number,))
+
+
+def parse_source(source):
+
+    try:
+        if source.path is not None:
+            response = ingest.worker.parser.parse(source.name, source.path)
+        else:
+            body = ingest.worker.s3_client.get_object(Bucket=source.bucket, Key=source.key)['Body']
+            try:
+                response = ingest.worker.parser.parse(source.name, body)
+            finally:
+                body.close()
+    except Exception as e:
+        logging.exception(e)
+        return source, None, str(e)
+
+    works = list(response.works)
+    for collection in response.collections:
+        works.extend(collection.works)
+    return source, works, None
+
+
+def list_sources(location):
+
+    if location.startswith('s3://'):
+        bucket, _, prefix = location[5:].partition('/')
+        return list_s3_sources(bucket, prefix)
+    return list_local_sources(location)
+
+
+def list_s3_sources(bucket, prefix):
+
+    sources = []
+    paginator = boto3.client('s3').get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            name = obj['Key'].rsplit('/', 1)[-1]
+            if is_ingest_file(name):
+                sources.append(Source(name, obj['ETag'].strip('"'), bucket=bucket, key=obj['Key']))
+    return sources
+
+
+def list_local_sources(directory):
+
+    sources = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if is_ingest_file(name) and os.path.isfile(path):
+            sources.append(Source(name, get_file_md5(path), path=path))
+    return sources
+
+
+def is_ingest_file(name):
+
+    return name.startswith('lib') or name.startswith('arc')
+
+
+def get_file_md5(path):
+
+    # matches the ETag S3 gives single-part uploads of the same file
+    digest = hashlib.md5()
+    with open(path, 'rb') as source_file:
+        for chunk in iter(lambda: source_file.read(1024 * 1024), ''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_checkpoint(filename):
+
+    if not os.path.exists(filename):
+        return {}
+    with open(filename, 'rb') as checkpoint_file:
+        return json.load(checkpoint_file)
+
+
+def save_checkpoint(filename, checkpoint):
+
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'wb') as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file)
+    os.rename(tmp_filename, filename)
+
+
+class BulkReport(object):
+
+    def __init__(self):
+
+        self.started = time.time()
+        self.files = 0
+        self.works = 0
+        self.images = 0
+        self.batches = 0
+        self.failed_images = 0
+        self.skipped = 0
+        self.failures = 0
+
+    def log(self):
+
+        elapsed = max(time.time() - self.started, 0.001)
+        summary = ("Bulk ingest finished in %.1fs: %d files, %d works, %d images in %d DLCS batches, "
+                   "%d images failed in DLCS, %d unchanged files skipped, %d failed files; "
+                   "%.1f works/min, %.1f images/s" % (
+                       elapsed, self.files, self.works, self.images, self.batches, self.failed_images, self.skipped,
+                       self.failures, self.works * 60.0 / elapsed, self.images / elapsed))
+        logging.info(summary)
+        print summary
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+# patch sockets, threads and locks before anything else imports them, so boto3, requests and the
+# fetch thread pool all yield to other requests while waiting on S3 and DLCS
+from gevent import monkey
+monkey.patch_all()
+
+import imp
+import logging
+import os
+from gevent.pool import Pool
+from gevent.pywsgi import WSGIServer
+import settings
+
+# a single process now holds many concurrent requests, so size the shared pools to match
+settings.FUSE_FETCH_WORKERS = settings.ASYNC_FETCH_WORKERS
+settings.S3_MAX_POOL_CONNECTIONS = settings.ASYNC_POOL_CONNECTIONS
+settings.DLCS_POOL_MAXSIZE = settings.ASYNC_POOL_CONNECTIONS
+
+fuse = imp.load_source('waylon_fuse', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'waylon-fuse.py'))
+
+
+def main():
+
+    fuse.configure_logging()
+
+    pool = Pool(settings.ASYNC_MAX_CONNECTIONS)
+    server = WSGIServer(('0.0.0.0', settings.ASYNC_PORT), fuse.app, spawn=pool, log=None)
+    logging.info("Waylon-Fuse async server started")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,62 @@
-import importlib
 import settings
-import boto3
 import json
-import requests
 import logging
-from flask import Flask, request
+import threading
+import time
+from flask import Flask, request, g
 from flask_cors import CORS
-from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from manifest_cache import ManifestCache, CacheEntry, get_digest
+from manifest_response import build_manifest_response, get_timestamp
+from manifest_decoration import WorkIndex, decorate_manifest, load_manifest
+import manifest_publishing
+from collection_index import CollectionTree, build_collection_document
+from metadata_index import MetadataIndex
+from metadata_encoding import decode_work_data
+from fuse_resources import get_resources
+from single_flight import SingleFlight
+from access_counter import AccessCounter
+import metrics
 
 application = Flask(__name__)
 app = application
 CORS(app)
 
+manifest_cache = ManifestCache(settings.MANIFEST_CACHE_MAX_BYTES, disk_path=settings.MANIFEST_CACHE_PATH)
+metadata_index = MetadataIndex(settings.WORK_INDEX_PATH)
+collection_tree = CollectionTree(metadata_index)
+collection_cache = ManifestCache(settings.COLLECTION_CACHE_MAX_BYTES)
+manifest_flights = SingleFlight()
+access_counter = AccessCounter(metadata_index, settings.FUSE_ACCESS_FLUSH_SECONDS)
+
+# manifests that could not be built because S3 or DLCS failed, for which the last good manifest is served instead
+UPSTREAM_ERROR_RESPONSE = ("error", 500)
+UPSTREAM_UNAVAILABLE_RESPONSE = ("dlcs unavailable", 503)
+
+# under uWSGI with lazy-apps this runs once in every worker process, and the first worker to claim the sync runs it
+if settings.FUSE_WARM_UP:
+    get_resources().warm_up()
+if settings.WORK_INDEX_SYNC_ON_START:
+    sync_resources = get_resources()
+    metadata_index.sync_in_background(sync_resources.s3_client, settings.META_S3, sync_resources.sync_executor)
+
+
+metrics.describe('waylon_fuse_request_seconds', 'Time to serve a request, by endpoint and status')
+metrics.describe('waylon_fuse_stage_seconds', 'Time spent in each stage of serving a manifest')
+metrics.describe('waylon_fuse_manifests_total', 'Manifests served, by where they came from')
+metrics.describe('waylon_fuse_prefetched_total', 'Manifests prefetched ahead of requests, by result')
+
 
 def main():
 
+    configure_logging()
+
+    app.run(threaded=True, debug=True, port=80, host='0.0.0.0')
+    logging.info("Waylon-Fuse server started")
+
+
+def configure_logging():
+
     logging.basicConfig(filename="waylon-fuse.log",
                         filemode='a',
                         level=logging.DEBUG,
@@ -23,140 +65,430 @@ def main():
     logging.getLogger('botocore').setLevel(logging.ERROR)
     logging.getLogger('werkzeug').setLevel(logging.ERROR)
 
-    app.run(threaded=True, debug=True, port=80, host='0.0.0.0')
-    logging.info("Waylon-Fuse server started")
+
+@app.before_request
+def start_request_timer():
+
+    g.request_start = time.time()
+
+
+@app.after_request
+def record_request_time(response):
+
+    if metrics.enabled:
+        metrics.observe('waylon_fuse_request_seconds', time.time() - g.request_start,
+                        endpoint=request.endpoint, status=response.status_code)
+    return response
+
+
+@app.after_request
+def count_manifest_access(response):
+
+    # only manifests actually served count, so requests for unknown works are not recorded
+    if request.endpoint == 'get_manifest_for_work' and response.status_code in (200, 304):
+        access_counter.record(request.view_args['manifest_reference'].replace('.manifest', ''))
+    return response
 
 
 @app.route('/work/<manifest_reference>')
 def get_manifest_for_work(manifest_reference):
 
-    p_ = importlib.import_module(settings.PARSER_PATH)
-    parser = p_.Parser(space=settings.CURRENT_SPACE)
+    resources = get_resources()
 
-    s3_client = boto3.client('s3')
-    logging.error("S3 client %s" % (s3_client,))
     logging.debug("Request recieved for manifest reference: " + str(manifest_reference))
-    logging.getLogger('boto').setLevel(logging.CRITICAL)
     work_reference = manifest_reference.replace('.manifest', '')
-    data = load_work_meta(s3_client, work_reference)
+
+    update_metadata_index(resources)
+
+    with metrics.timer('waylon_fuse_stage_seconds', stage='cache'):
+        entry, stale = get_cached_manifest(resources, work_reference)
+    if entry is not None:
+        metrics.increment('waylon_fuse_manifests_total', source='stale' if stale else 'cache')
+        return build_manifest_response(entry, request.headers, stale)
+
+    # concurrent misses for the same work share one fetch and decoration. Ids are built from the url without its
+    # query string, so the cached manifest is the same whatever query the request that built it carried
+    result, shared = manifest_flights.do(('build', work_reference, request.base_url), load_manifest_entry,
+                                         resources, work_reference, request.base_url)
+    if shared:
+        metrics.increment('waylon_fuse_manifests_total', source='coalesced')
+    if not isinstance(result, CacheEntry):
+        # an error response
+        if result in (UPSTREAM_ERROR_RESPONSE, UPSTREAM_UNAVAILABLE_RESPONSE):
+            entry = get_last_good_manifest(work_reference)
+            if entry is not None:
+                metrics.increment('waylon_fuse_manifests_total', source='stale')
+                return build_manifest_response(entry, request.headers, True)
+        return result
+    return build_manifest_response(result, request.headers)
+
+
+def load_manifest_entry(resources, work_reference, base_url):
+
+    # returns the new cache entry, or the error response when the manifest cannot be built
+    parser = resources.parser
+
+    # a flight for this work may have landed between the cache lookup and this one starting
+    entry = manifest_cache.get(work_reference)
+    if entry is not None and entry.base_url == base_url and \
+            entry.is_fresh(settings.MANIFEST_CACHE_REVALIDATE_SECONDS):
+        return entry
+
+    if settings.SERVE_PUBLISHED_MANIFESTS:
+        with metrics.timer('waylon_fuse_stage_seconds', stage='published'):
+            entry = get_published_manifest(resources, work_reference, base_url)
+        if entry is not None:
+            metrics.increment('waylon_fuse_manifests_total', source='published')
+            manifest_cache.put(entry)
+            return entry
+
+    # while dlcs is failing, answer at once rather than fetching metadata for a manifest that cannot be built
+    if resources.dlcs_breaker.is_open():
+        metrics.increment('waylon_fuse_manifests_total', source='unavailable')
+        return UPSTREAM_UNAVAILABLE_RESPONSE
+
+    # use named query to get manifest from dlcs
+    path = parser.get_manifest_path_from_reference(work_reference)
+
+    # the metadata and dlcs manifest are independent, so fetch them concurrently
+    meta_future = resources.executor.submit(load_work_meta, resources.s3_client, work_reference, metadata_index)
+    manifest_future = resources.executor.submit(get_dlcs_manifest, resources, path)
+
+    try:
+        data, s3_etag, s3_last_modified = meta_future.result(timeout=settings.S3_TIMEOUT)
+    except TimeoutError:
+        manifest_future.cancel()
+        logging.error("Timed out obtaining metadata for " + str(work_reference))
+        metrics.increment('waylon_fuse_manifests_total', source='error')
+        return UPSTREAM_ERROR_RESPONSE
+    except Exception:
+        # the work may well exist, so this is an upstream error that a last good manifest can cover
+        manifest_future.cancel()
+        logging.exception("error obtaining metadata for " + str(work_reference))
+        metrics.increment('waylon_fuse_manifests_total', source='error')
+        return UPSTREAM_ERROR_RESPONSE
     if data is None:
+        # fail fast rather than waiting on dlcs
+        manifest_future.cancel()
         logging.error("Work data not found: " + str(work_reference))
+        metrics.increment('waylon_fuse_manifests_total', source='not_found')
         return "work not found", 500
 
-    # use named query to get manifest from dlcs
-    path = parser.get_manifest_path_from_reference(work_reference)
-   
     # get manifest
-    req = requests.get(path)
-    if req.status_code is not 200:
+    try:
+        req = manifest_future.result(timeout=settings.DLCS_TIMEOUT)
+    except TimeoutError:
+        logging.error("Timed out obtaining manifest for " + str(work_reference))
+        # the request carries on in the pool, but this caller has given up on it
+        resources.dlcs_breaker.record_failure()
+        req = None
+    if req is None or req.status_code != 200:
         logging.error("Error obtaining manifest")
-        return "error", 500
+        metrics.increment('waylon_fuse_manifests_total', source='error')
+        return UPSTREAM_ERROR_RESPONSE
 
-    else:
+    with metrics.timer('waylon_fuse_stage_seconds', stage='parse'):
         manifest_string = req.text
-        manifest = json.loads(manifest_string, object_pairs_hook=OrderedDict)
-        update_manifest_ids(manifest)
+        manifest = load_manifest(manifest_string)
 
-        canvas_mapping = generate_canvas_map(manifest)
+    # rewrite ids and decorate manifest with meta, toc and image metadata
+    with metrics.timer('waylon_fuse_stage_seconds', stage='decorate'):
+        decorate_manifest(WorkIndex(data), manifest, base_url, base_url)
 
-        # decorate manifest with meta
-        decorate_manifest_metadata(data, manifest)
+        parser.custom_decoration(data, manifest)
 
-        decorate_manifest_toc(data, manifest, canvas_mapping)
+    with metrics.timer('waylon_fuse_stage_seconds', stage='serialise'):
+        entry = CacheEntry(work_reference, json.dumps(manifest),
+                           base_url=base_url,
+                           last_modified=get_last_modified(s3_last_modified, req.headers.get('Last-Modified')),
+                           s3_etag=s3_etag,
+                           dlcs_etag=req.headers.get('ETag'),
+                           dlcs_digest=get_digest(req.content))
+    manifest_cache.put(entry)
+    metrics.increment('waylon_fuse_manifests_total', source='built')
+    return entry
 
-        decorate_manifest_image_metadata(data, manifest)
 
-        parser.custom_decoration(data, manifest)
+def get_published_manifest(resources, work_reference, base_url):
 
-        # return manifest
-        return json.dumps(manifest), 200, {'Content-Type': 'text/css; charset=utf-8'}
+    # a manifest prebuilt at ingest time turns a miss into a single S3 read
+    try:
+        obj = manifest_publishing.load_published_manifest(resources.s3_client, work_reference)
+    except Exception:
+        logging.exception("error obtaining published manifest for %s" % (work_reference,))
+        return None
+    if obj is None:
+        return None
+    metadata = obj.get('Metadata', {})
+    # ids in the published manifest are only right for requests to the public url
+    if metadata.get(manifest_publishing.MANIFEST_URL_METADATA_KEY) != base_url:
+        return None
+    return CacheEntry(work_reference, obj['Body'].read(),
+                      base_url=base_url,
+                      last_modified=get_timestamp(obj.get('LastModified')),
+                      s3_etag=metadata.get(manifest_publishing.WORK_ETAG_METADATA_KEY),
+                      dlcs_etag=metadata.get(manifest_publishing.DLCS_ETAG_METADATA_KEY),
+                      dlcs_digest=metadata.get(manifest_publishing.DLCS_DIGEST_METADATA_KEY))
 
 
-def update_manifest_ids(manifest):
+def get_dlcs_manifest(resources, path, headers=None):
 
-    work_id = request.url.replace('.manifest', '')
-    manifest['@id'] = work_id
-    manifest['sequences'][0]['@id'] = work_id + '/sequences/0'
-    canvas_index = 0
-    for canvas in manifest['sequences'][0]['canvases']:
-        canvas_id = work_id + '/canvas/' + str(canvas_index)
-        canvas['@id'] = canvas_id
-        for image in canvas['images']:
-            image['on'] = canvas_id
-        canvas_index += 1
+    # returns None when the request fails or is refused by the circuit breaker
+    breaker = resources.dlcs_breaker
+    if not breaker.allow():
+        return None
+    try:
+        with metrics.timer('waylon_fuse_stage_seconds', stage='dlcs'):
+            req = resources.dlcs_session.get(path, headers=headers,
+                                             timeout=(settings.DLCS_CONNECT_TIMEOUT, settings.DLCS_TIMEOUT))
+    except Exception:
+        logging.exception("error obtaining manifest from %s" % (path,))
+        breaker.record_failure()
+        return None
+    if req.status_code >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    return req
+
+
+def get_last_modified(s3_last_modified, dlcs_last_modified):
+
+    # without a dlcs timestamp the image list may have changed at any time up to now
+    dlcs_timestamp = get_timestamp(dlcs_last_modified)
+    if dlcs_timestamp is None:
+        dlcs_timestamp = int(time.time())
+    if s3_last_modified is None:
+        return dlcs_timestamp
+    return max(s3_last_modified, dlcs_timestamp)
+
+
+def get_cached_manifest(resources, work_reference):
+
+    # returns (entry, stale), stale entries being served without confirming they are current
+    entry = manifest_cache.get(work_reference)
+    if entry is None:
+        return None, False
+    # ids in the manifest are derived from the request url
+    if entry.base_url != request.base_url:
+        return None, False
+    if entry.is_fresh(settings.MANIFEST_CACHE_REVALIDATE_SECONDS):
+        return entry, False
+    if entry.is_fresh(settings.MANIFEST_CACHE_REVALIDATE_SECONDS + settings.MANIFEST_STALE_WHILE_REVALIDATE_SECONDS):
+        # serve it now and bring it up to date off the request thread
+        manifest_flights.do_in_background(resources.refresh_executor, ('refresh', work_reference, entry.base_url),
+                                          refresh_manifest_entry, resources, entry)
+        return entry, True
+    # as with misses, concurrent requests for a stale entry share one revalidation
+    with metrics.timer('waylon_fuse_stage_seconds', stage='revalidate'):
+        valid = manifest_flights.do(('revalidate', work_reference, entry.etag), is_cached_manifest_valid,
+                                    resources, entry)[0]
+    if valid:
+        entry.touch()
+        return entry, False
+    if valid is None and entry.is_fresh(settings.MANIFEST_CACHE_REVALIDATE_SECONDS +
+                                        settings.MANIFEST_STALE_IF_ERROR_SECONDS):
+        # S3 or DLCS could not be asked, and the last good manifest beats an error
+        return entry, True
+    # an outdated entry stays cached until the rebuild replaces it, to stand in if that fails
+    return None, False
+
+
+def get_last_good_manifest(work_reference):
+
+    entry = manifest_cache.get(work_reference)
+    if entry is None or entry.base_url != request.base_url:
+        return None
+    if not entry.is_fresh(settings.MANIFEST_CACHE_REVALIDATE_SECONDS + settings.MANIFEST_STALE_IF_ERROR_SECONDS):
+        return None
+    return entry
 
 
-def decorate_manifest_metadata(data, manifest):
+def refresh_manifest_entry(resources, entry):
 
-    manifest['metadata'] = data['meta']
+    # runs on the refresh pool for an entry that has been served stale
+    try:
+        with metrics.timer('waylon_fuse_stage_seconds', stage='refresh'):
+            valid = is_cached_manifest_valid(resources, entry)
+            if valid:
+                entry.touch()
+            elif valid is False:
+                manifest_flights.do(('build', entry.reference, entry.base_url), load_manifest_entry,
+                                    resources, entry.reference, entry.base_url)
+    except Exception:
+        logging.exception("error refreshing manifest for %s" % (entry.reference,))
 
 
-def decorate_manifest_image_metadata(data, manifest):
+def is_cached_manifest_valid(resources, entry):
 
-    image_metadata = data['image_metadata']
-    canvases = manifest['sequences'][0]['canvases']
+    # returns True or False, or None when S3 or DLCS could not be asked
+    try:
+        obj = resources.s3_client.head_object(Bucket=settings.META_S3, Key='work-' + str(entry.reference))
+    except resources.s3_client.exceptions.ClientError as e:
+        if e.response.get('Error', {}).get('Code') not in ('404', 'NoSuchKey'):
+            logging.exception("error revalidating metadata for %s" % (entry.reference,))
+            return None
+        # the work has been deleted, so there is no last good manifest to keep
+        metadata_index.remove_work(entry.reference)
+        manifest_cache.invalidate(entry.reference)
+        return False
+    except Exception:
+        logging.exception("error revalidating metadata for %s" % (entry.reference,))
+        return None
+    if obj.get('ETag') != entry.s3_etag:
+        # the index may hold the same outdated version, so let the rebuild read the work from S3
+        metadata_index.remove_work(entry.reference, unless_etag=obj.get('ETag'))
+        return False
+
+    headers = {}
+    if entry.dlcs_etag is not None:
+        headers['If-None-Match'] = entry.dlcs_etag
+    path = resources.parser.get_manifest_path_from_reference(entry.reference)
+    req = get_dlcs_manifest(resources, path, headers)
+    if req is None or req.status_code >= 500:
+        return None
+    if req.status_code == 304:
+        return True
+    if req.status_code == 200:
+        # dlcs did not honour the conditional request, compare the content instead
+        return get_digest(req.content) == entry.dlcs_digest
+    return False
 
-    canvas_label_field = None
-    flags = data.get('flags')
-    if flags is not None:
-        canvas_label_field = flags.get('Canvas_Label_Field')
 
-    for image_index_string in image_metadata:
-        image_index = int(image_index_string)
-        canvases[image_index]['metadata'] = image_metadata[image_index_string]
-        if canvas_label_field is None:
-            canvases[image_index]['label'] = str(image_index + 1)
-        else:
-            page = ""
-            for i in image_metadata[image_index_string]:
-                label = i.get('label')
-                if label is not None and label == canvas_label_field:
-                    val = i.get('value')
-                    if val is not None:
-                        page = val
-            canvases[image_index]['label'] = page
+@app.route('/collection/<collection_reference>')
+def get_collection(collection_reference):
 
+    resources = get_resources()
+    if metadata_index.get_synced() is None:
+        # nothing to list until the index has been loaded from the bucket once
+        metadata_index.sync_once(resources.s3_client, settings.META_S3, resources.sync_executor)
+    else:
+        update_metadata_index(resources)
+
+    revision, group = collection_tree.get_group(collection_reference)
+    if group is None:
+        return "collection not found", 404
+    page = request.args.get('page', type=int)
+
+    # documents are cached per index revision, so any change to the index makes older entries unreachable
+    key = '%s?page=%s#%d' % (collection_reference, page, revision)
+    entry = collection_cache.get(key)
+    if entry is None or entry.base_url != request.url_root:
+        document = build_collection_document(group, request.url_root, page, settings.COLLECTION_PAGE_SIZE)
+        if document is None:
+            return "page not found", 404
+        entry = CacheEntry(key, json.dumps(document), request.url_root, int(time.time()))
+        collection_cache.put(entry)
+    return build_manifest_response(entry, request.headers)
+
+
+@app.route('/metrics')
+def get_metrics():
+
+    # gauges are sampled per request; under uWSGI each worker process reports its own values
+    gauges = []
+    for cache_name, cache in (('manifest', manifest_cache), ('collection', collection_cache)):
+        for name, value in sorted(cache.stats().items()):
+            gauges.append(('waylon_fuse_cache_' + name, value, {'cache': cache_name}))
+    for pool_name, stats in sorted(get_resources().pool_stats().items()):
+        for name, value in sorted(stats.items()):
+            gauges.append(('waylon_fuse_pool_' + name, value, {'pool': pool_name}))
+    for name, value in sorted(get_resources().dlcs_breaker.stats().items()):
+        gauges.append(('waylon_fuse_dlcs_breaker_' + name, value, {}))
+    gauges.append(('waylon_fuse_metadata_index_revision', metadata_index.get_revision(), {}))
+    return metrics.registry.render(gauges), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+
+def start_prefetching():
+
+    # under uWSGI every worker prefetches, so a shared MANIFEST_CACHE_PATH saves them building the same manifests
+    if not settings.PUBLIC_BASE_URL:
+        logging.error("PUBLIC_BASE_URL is needed to prefetch manifests")
+        return
 
-def decorate_manifest_toc(data, manifest, canvas_mapping):
+    def run():
+        # wait for a sync started alongside, here or in another worker, or a fresh index would have nothing to prefetch
+        while metadata_index.is_syncing():
+            time.sleep(1)
+        while True:
+            try:
+                prefetch_manifests(get_resources(), settings.FUSE_PREFETCH_WORKS)
+            except Exception:
+                logging.exception("Could not prefetch manifests")
+            if settings.FUSE_PREFETCH_SECONDS <= 0:
+                return
+            time.sleep(settings.FUSE_PREFETCH_SECONDS)
+
+    thread = threading.Thread(target=run, name='manifest-prefetch')
+    thread.daemon = True
+    thread.start()
+
+
+def prefetch_manifests(resources, count):
+
+    # builds and caches the manifests of the most requested works, as requested at the public url
+    access_counter.flush()
+    references = metadata_index.get_popular_works(count)
+    start = time.time()
+    results = {}
+    executor = ThreadPoolExecutor(max_workers=settings.FUSE_PREFETCH_CONCURRENCY)
+    try:
+        for result in executor.map(lambda reference: prefetch_manifest(resources, reference), references):
+            results[result] = results.get(result, 0) + 1
+            metrics.increment('waylon_fuse_prefetched_total', result=result)
+    finally:
+        executor.shutdown()
+    logging.info("Prefetched %d manifests in %.1fs: %s" % (len(references), time.time() - start, results))
+    return results
 
-    structures = []
-    toc = data.get('toc')
-    if toc is None:
-        return
-    r = 0
-    for entry in toc.keys():
-        structure = {
-                '@type': 'sc:Range',
-                '@id': request.base_url + '/range/r-' + str(r),
-                'label': entry,
-                'canvases': map(lambda e: canvas_mapping[e], toc[entry])}
-        r += 1
-        structures.append(structure)
-    manifest['structures'] = structures
 
+def prefetch_manifest(resources, work_reference):
 
-def generate_canvas_map(manifest):
+    manifest_url = manifest_publishing.get_public_manifest_url(work_reference)
+    entry = manifest_cache.get(work_reference)
+    if entry is not None and entry.base_url == manifest_url and entry.is_fresh(
+            settings.MANIFEST_CACHE_REVALIDATE_SECONDS + settings.MANIFEST_STALE_WHILE_REVALIDATE_SECONDS):
+        return 'cached'
+    # shares the flight of any request missing on the same work meanwhile
+    result = manifest_flights.do(('build', work_reference, manifest_url), load_manifest_entry,
+                                 resources, work_reference, manifest_url)[0]
+    if isinstance(result, CacheEntry):
+        return 'built'
+    return 'error'
 
-    canvases = manifest['sequences'][0]['canvases']
-    mapping = dict(map(lambda (i, x): (i, x['@id']), enumerate(canvases)))
-    return mapping
 
+def update_metadata_index(resources):
 
-@app.route('/collection/<collection_reference>')
-def get_collection(collection_reference):
-    # not implemented
-    pass
+    # requests are served from the current index while it is brought up to date
+    if metadata_index.is_stale(settings.WORK_INDEX_SYNC_SECONDS):
+        metadata_index.sync_in_background(resources.s3_client, settings.META_S3, resources.sync_executor)
 
 
-def load_work_meta(s3_client, reference_id):
+def load_work_meta(s3_client, reference_id, index):
 
+    # returns (None, None, None) for a work that is not stored, other failures are raised to the caller
+    with metrics.timer('waylon_fuse_stage_seconds', stage='metadata_index'):
+        indexed = index.get_work(reference_id)
+    if indexed is not None:
+        return indexed
+    logging.debug('ref id : %s in bucket %s' % (reference_id, settings.META_S3))
     try:
-        logging.error('ref id : %s in bucket %s' % (reference_id, settings.META_S3))
-        obj = s3_client.get_object(Bucket=settings.META_S3, Key='work-' + str(reference_id))
-        return json.loads(obj['Body'].read(), object_pairs_hook=OrderedDict)
-    except:
-        logging.exception("error obtaining metadata")
-        return None
+        with metrics.timer('waylon_fuse_stage_seconds', stage='metadata_s3'):
+            obj = s3_client.get_object(Bucket=settings.META_S3, Key='work-' + str(reference_id))
+            body = obj['Body'].read()
+    except s3_client.exceptions.NoSuchKey:
+        return None, None, None
+    last_modified = get_timestamp(obj.get('LastModified'))
+    try:
+        index.put_work(reference_id, obj.get('ETag'), body, last_modified)
+    except Exception:
+        logging.exception("Could not index work %s" % (reference_id,))
+    return decode_work_data(body), obj.get('ETag'), last_modified
+
+
+# started once everything it calls is defined, and like the warm up above in every worker process
+if settings.FUSE_PREFETCH_WORKS > 0:
+    start_prefetching()
 
 if __name__ == "__main__":
     main()
@@ -5,19 +5,62 @@ import sys
 import json
 import importlib
 import settings
+import threading
+import time
 import uuid
+import argparse
 import dlcs
+import manifest_cache
+import manifest_publishing
+import metrics
+from metadata_index import MetadataIndex
+from metadata_encoding import encode_work_data, decode_work_data
+from multiprocessing import Pool, util
+from multiprocessing.pool import ThreadPool
 from requests import post, get, auth
 from collections import OrderedDict
 import dlcs.image_collection
+from dlcs.batch_tracker import BatchTracker
 
 
-s3_client = None
+STOP_FILE = '/tmp/waylon-stop.txt'
+
+# maximum number of entries in an SQS batch request
+SQS_BATCH_SIZE = 10
+
+# user metadata on work-<id> objects recording the ETag of the last successfully ingested source file
+SOURCE_ETAG_METADATA_KEY = 'source-etag'
+
+# parser and S3 client for the current pool worker, set up once by init_worker
+worker = threading.local()
+
+# reprocess files even when their content matches the last successful ingest
+force_reingest = settings.FORCE_REINGEST
+
+# polls the DLCS batches of registered works, shared by the workers in a process
+batch_tracker = None
+batch_tracker_lock = threading.Lock()
+
+# local index of stored work metadata, kept up to date as works are stored when fuse shares the host
+metadata_index = None
+if settings.WORK_INDEX_PATH:
+    metadata_index = MetadataIndex(settings.WORK_INDEX_PATH)
+
+metrics.describe('waylon_ingest_message_seconds', 'Time to process a message')
+metrics.describe('waylon_ingest_stage_seconds', 'Time spent in each stage of ingesting a work')
+metrics.describe('waylon_ingest_messages_total', 'Messages processed, by result')
+metrics.describe('waylon_ingest_works_total', 'Works ingested, by whether they were updated incrementally')
 
 
 def main():
 
-    global s3_client
+    global force_reingest
+
+    arg_parser = argparse.ArgumentParser(description='Waylon ingest worker')
+    arg_parser.add_argument('--force', action='store_true',
+                            help='ingest files even if their content matches the last ingest of the work')
+    args = arg_parser.parse_args()
+    force_reingest = force_reingest or args.force
 
     logging.basicConfig(filename="waylon-ingest.log",
                         filemode='a',
@@ -27,56 +70,255 @@ def main():
     logging.getLogger('botocore').setLevel(logging.ERROR)
     logging.getLogger('werkzeug').setLevel(logging.ERROR)
 
-    p_ = importlib.import_module(settings.PARSER_PATH)
-    parser = p_.Parser(space=settings.CURRENT_SPACE)
-    s3_client = boto3.client('s3')
-
     input_queue = get_input_queue()
     if input_queue is None:
         logging.error("Could not obtain input queue")
 
-    messages_per_fetch = settings.MESSAGES_PER_FETCH
+    error_queue = get_error_queue()
+
+    pool = create_pool()
+    capacity = settings.NUM_POOL_WORKERS * settings.MESSAGES_PER_WORKER
+    in_flight = {}
+    completed = []
+    worker_stats = {}
+    last_stats_log = time.time()
+    last_delete_flush = time.time()
 
     while True:
-        if os.path.exists('/tmp/waylon-stop.txt'):
+        stopping = os.path.exists(STOP_FILE)
+        if stopping and len(in_flight) == 0:
+            # drained: all received messages have been processed
+            delete_messages(input_queue, completed)
+            pool.close()
+            pool.join()
+            if batch_tracker is not None:
+                # a thread pool shares this process's tracker; process pool workers drain their own as they exit
+                drain_batch_tracker()
+            log_worker_stats(worker_stats)
             sys.exit()
-        messages = input_queue.receive_messages(MaxNumberOfMessages=messages_per_fetch, VisibilityTimeout=120,
-                                                WaitTimeSeconds=20)
 
-        if len(messages) > 0:
+        available = capacity - len(in_flight)
+        if not stopping and available > 0:
+            # only long-poll when there is nothing in flight that needs collecting or extending
+            wait_time = 20 if len(in_flight) == 0 else 1
+            messages = input_queue.receive_messages(MaxNumberOfMessages=min(settings.MESSAGES_PER_FETCH, available),
+                                                    VisibilityTimeout=settings.VISIBILITY_TIMEOUT,
+                                                    WaitTimeSeconds=wait_time)
             for message in messages:
-                result = process_message(message, parser)
-                message.delete()
-                if not result:
-                    send_error_message(message)
+                in_flight[message.message_id] = InFlightMessage(message, pool.apply_async(run_message,
+                                                                                          (message.body,)))
+        else:
+            time.sleep(1)
 
+        collect_completed_messages(in_flight, completed, worker_stats, error_queue)
+        if len(completed) >= SQS_BATCH_SIZE or time.time() - last_delete_flush > settings.DELETE_FLUSH_INTERVAL:
+            delete_messages(input_queue, completed)
+            last_delete_flush = time.time()
+        extend_message_visibility(input_queue, in_flight)
 
-# initialise pool processes with instance of the configured parser
+        if time.time() - last_stats_log > settings.WORKER_STATS_INTERVAL:
+            log_worker_stats(worker_stats)
+            last_stats_log = time.time()
 
-def process_message(message, parser):
 
-    logging.debug("Processing message")
-    try:
-        # extract the bucket and key of new file from the notification message
-        bucket, key = get_file_details_from_message(message.body)
+class InFlightMessage(object):
+
+    def __init__(self, message, async_result):
+
+        self.message = message
+        self.async_result = async_result
+        self.started = time.time()
+        self.visibility_extended = self.started
+
+
+def create_pool():
+
+    if settings.INGEST_POOL_TYPE == 'process':
+        return Pool(processes=settings.NUM_POOL_WORKERS, initializer=init_worker)
+    return ThreadPool(processes=settings.NUM_POOL_WORKERS, initializer=init_worker)
+
+
+# initialise pool workers with instance of the configured parser and their own S3 client
+
+def init_worker():
+
+    global batch_tracker
+
+    p_ = importlib.import_module(settings.PARSER_PATH)
+    worker.parser = p_.Parser(space=settings.CURRENT_SPACE)
+    worker.s3_client = boto3.client('s3')
+
+    with batch_tracker_lock:
+        if batch_tracker is None:
+            batch_tracker = BatchTracker()
+            batch_tracker.start()
+            # runs as this process exits, including pool worker processes once a graceful stop closes the pool
+            util.Finalize(None, drain_batch_tracker, exitpriority=10)
 
-        # download the new file to a temporary location
-        filename = download_file(bucket, key)
 
-        # use the configured parser to extract metadata and ImageCollections for DLCS registration
-        response = parser.parse(str(key), filename)
+def drain_batch_tracker():
 
-        # process parse results
-        process_results(response, parser)
+    # the tracker thread is a daemon, so wait for the callbacks that record sources and publish manifests of works
+    # still being processed by DLCS rather than losing them with it
+    outstanding = batch_tracker.outstanding()
+    if outstanding == 0:
+        return
+    logging.info("Waiting up to %ds for DLCS to finish %d registrations" % (settings.INGEST_STOP_WAIT_SECONDS,
+                                                                            outstanding))
+    if not batch_tracker.wait(settings.INGEST_STOP_WAIT_SECONDS):
+        logging.error("Stopping with DLCS registrations outstanding for works %s, their sources will not be recorded "
+                      "or manifests published" % (', '.join(batch_tracker.get_work_ids()),))
+
+
+def run_message(message_body):
+
+    start = time.time()
+    result = process_message(message_body, worker.parser)
+    elapsed = time.time() - start
+    if metrics.enabled:
+        metrics.observe('waylon_ingest_message_seconds', elapsed)
+        # each pool worker reports the metrics it has gathered
+        metrics.registry.dump_if_due(settings.METRICS_DUMP_INTERVAL, settings.METRICS_DUMP_PATH)
+    worker_name = '%s/%s' % (os.getpid(), threading.current_thread().name)
+    return result, worker_name, elapsed
+
+
+def collect_completed_messages(in_flight, completed, worker_stats, error_queue):
+
+    for message_id in list(in_flight.keys()):
+        pending = in_flight[message_id]
+        if not pending.async_result.ready():
+            continue
+        del in_flight[message_id]
+        try:
+            result, worker_name, elapsed = pending.async_result.get()
+        except Exception as e:
+            logging.exception(e)
+            result, worker_name, elapsed = False, 'unknown', time.time() - pending.started
+        record_worker_stats(worker_stats, worker_name, result, elapsed)
+        if not result:
+            send_error_message(error_queue, pending.message)
+        completed.append(pending.message)
+
+
+def delete_messages(input_queue, completed):
+
+    while len(completed) > 0:
+        batch = completed[:SQS_BATCH_SIZE]
+        del completed[:SQS_BATCH_SIZE]
+        entries = [{'Id': str(i), 'ReceiptHandle': message.receipt_handle} for i, message in enumerate(batch)]
+        try:
+            response = input_queue.delete_messages(Entries=entries)
+        except Exception:
+            logging.exception("Could not delete batch of %d messages" % (len(batch),))
+            continue
+        for failure in response.get('Failed', []):
+            logging.error("Could not delete message %s: %s" % (batch[int(failure['Id'])].message_id,
+                                                                failure.get('Message')))
+
+
+def extend_message_visibility(input_queue, in_flight):
+
+    # keep long jobs hidden from other consumers until they finish
+    now = time.time()
+    due = [pending for pending in in_flight.values()
+           if now - pending.visibility_extended >= settings.VISIBILITY_HEARTBEAT_INTERVAL]
+    for start in range(0, len(due), SQS_BATCH_SIZE):
+        batch = due[start:start + SQS_BATCH_SIZE]
+        entries = [{'Id': str(i),
+                    'ReceiptHandle': pending.message.receipt_handle,
+                    'VisibilityTimeout': settings.VISIBILITY_TIMEOUT} for i, pending in enumerate(batch)]
+        try:
+            response = input_queue.change_message_visibility_batch(Entries=entries)
+        except Exception:
+            logging.exception("Could not extend visibility of %d messages" % (len(batch),))
+            continue
+        failed = set()
+        for failure in response.get('Failed', []):
+            failed.add(int(failure['Id']))
+            logging.error("Could not extend visibility of message %s: %s" % (
+                batch[int(failure['Id'])].message.message_id, failure.get('Message')))
+        for i, pending in enumerate(batch):
+            if i not in failed:
+                pending.visibility_extended = now
+
+
+def record_worker_stats(worker_stats, worker_name, result, elapsed):
+
+    stats = worker_stats.get(worker_name)
+    if stats is None:
+        stats = {'messages': 0, 'failures': 0, 'busy_seconds': 0.0, 'first_seen': time.time() - elapsed}
+        worker_stats[worker_name] = stats
+    stats['messages'] += 1
+    if not result:
+        stats['failures'] += 1
+    stats['busy_seconds'] += elapsed
+
+
+def log_worker_stats(worker_stats):
+
+    for worker_name in sorted(worker_stats.keys()):
+        stats = worker_stats[worker_name]
+        elapsed_minutes = max(time.time() - stats['first_seen'], 1.0) / 60.0
+        logging.info("Worker %s: %d messages (%d failed), %.2f messages/min, %.1f%% busy" % (
+            worker_name, stats['messages'], stats['failures'], stats['messages'] / elapsed_minutes,
+            100.0 * stats['busy_seconds'] / (elapsed_minutes * 60.0)))
+
+
+def process_message(message_body, parser):
 
-        # delete temporary file
-        os.remove(filename)
+    logging.debug("Processing message")
+    try:
+        # extract the bucket and key of new file from the notification message
+        bucket, key, etag = get_file_details_from_message(message_body)
+        with metrics.timer('waylon_ingest_stage_seconds', stage='check_source'):
+            if etag is None:
+                etag = worker.s3_client.head_object(Bucket=bucket, Key=key)['ETag']
+            etag = etag.strip('"')
+
+            work_id = parser.get_work_id_from_filename(str(key))
+            unchanged = not force_reingest and get_ingested_source_etag(work_id) == etag
+        if unchanged:
+            logging.info("Skipping %s, unchanged since the last ingest of work %s" % (key, work_id))
+            metrics.increment('waylon_ingest_messages_total', result='skipped')
+            return True
+
+        if settings.INGEST_STREAMING:
+            # parse rows as they arrive from S3 rather than staging the file on disk
+            with metrics.timer('waylon_ingest_stage_seconds', stage='download_parse'):
+                body = worker.s3_client.get_object(Bucket=bucket, Key=key)['Body']
+                try:
+                    response = parser.parse(str(key), body)
+                finally:
+                    body.close()
+        else:
+            # download the new file to a temporary location
+            with metrics.timer('waylon_ingest_stage_seconds', stage='download'):
+                filename = download_file(bucket, key)
+            try:
+                # use the configured parser to extract metadata and ImageCollections for DLCS registration
+                with metrics.timer('waylon_ingest_stage_seconds', stage='parse'):
+                    response = parser.parse(str(key), filename)
+            finally:
+                # delete temporary file
+                os.remove(filename)
+
+        # process parse results, recording the source only once the whole pipeline has succeeded and the works'
+        # DLCS batches have finished
+        worker.source_record = SourceRecord(work_id, etag, worker.s3_client)
+        try:
+            process_results(response, parser)
+        finally:
+            source_record, worker.source_record = worker.source_record, None
+        source_record.release()
 
     except Exception as e:
         logging.exception(e)
+        metrics.increment('waylon_ingest_messages_total', result='failed')
         return False
 
     logging.debug("Message processed")
+    metrics.increment('waylon_ingest_messages_total', result='processed')
     return True
 
 
@@ -90,37 +332,175 @@ def process_results(response, parser):
         process_work(work, parser)
 
 
+def get_ingested_source_etag(work_id):
+
+    try:
+        obj = worker.s3_client.head_object(Bucket=settings.META_S3, Key='work-' + work_id)
+    except worker.s3_client.exceptions.ClientError:
+        return None
+    return obj.get('Metadata', {}).get(SOURCE_ETAG_METADATA_KEY)
+
+
+def record_ingested_source_etag(work_id, etag, s3_client=None):
+
+    # rewrite the object's user metadata in place, leaving its body (and content ETag) unchanged
+    if s3_client is None:
+        s3_client = worker.s3_client
+    key = 'work-' + work_id
+    s3_client.copy_object(Bucket=settings.META_S3, Key=key,
+                          CopySource={'Bucket': settings.META_S3, 'Key': key},
+                          Metadata={SOURCE_ETAG_METADATA_KEY: etag},
+                          MetadataDirective='REPLACE')
+
+
+class SourceRecord(object):
+
+    # records the source file's ETag once the message and the DLCS batches of every work registered from it have
+    # finished, and not at all if any image failed, so the same file arriving again is ingested rather than skipped
+
+    def __init__(self, work_id, etag, s3_client):
+
+        self.work_id = work_id
+        self.etag = etag
+        self.s3_client = s3_client
+        self.lock = threading.Lock()
+        self.outstanding = 1  # held by the message until it has been processed
+        self.errors = 0
+
+    def add(self):
+
+        with self.lock:
+            self.outstanding += 1
+
+    def release(self, status=None):
+
+        with self.lock:
+            if status is not None:
+                self.errors += status['errors']
+            self.outstanding -= 1
+            if self.outstanding > 0:
+                return
+        if self.errors > 0:
+            logging.error("Not recording the source of work %s, %d images failed to register" % (
+                self.work_id, self.errors))
+            return
+        with metrics.timer('waylon_ingest_stage_seconds', stage='record_source'):
+            record_ingested_source_etag(self.work_id, self.etag, self.s3_client)
+
+
 def process_work(work, parser):
 
+    if settings.INGEST_INCREMENTAL:
+        with metrics.timer('waylon_ingest_stage_seconds', stage='load_metadata'):
+            previous_data = load_work_metadata(work.id)
+        if previous_data is not None and update_work_incrementally(work, parser, previous_data):
+            metrics.increment('waylon_ingest_works_total', mode='incremental')
+            return
+
     store_work_metadata(work)
     remove_existing_images(work, parser)
     register_work_imagecollection(work)
+    metrics.increment('waylon_ingest_works_total', mode='full')
 
 
-def remove_existing_images(work, parser):
+def update_work_incrementally(work, parser, previous_data):
+
+    # returns False when the registered images cannot be matched up, so the caller falls back to a full re-ingest
+    previous_origins = previous_data.get('images')
+    if previous_origins is None:
+        return False
+    image_ids = get_registered_image_ids(work, parser)
+    if image_ids is None or len(image_ids) != len(previous_origins):
+        logging.debug("Registered images for %s do not match stored metadata" % (work.id,))
+        return False
+
+    removed_ids, moved, added = diff_work_images(previous_origins, image_ids, work.image_collection.members)
+
+    data = get_work_metadata_data(work)
+    if json.loads(json.dumps(data)) != previous_data:
+        store_work_metadata(work, data)
+    if len(removed_ids) > 0:
+        delete_images(removed_ids)
+    for image_id, number_2 in moved:
+        with metrics.timer('waylon_ingest_stage_seconds', stage='dlcs_patch'):
+            patched = dlcs.client.patch_image(image_id, {'number2': number_2})
+        if not patched:
+            logging.error("Could not update number2 of image %s" % (image_id,))
+    if len(added) > 0:
+        register_images(work.id, dlcs.image_collection.ImageCollection(added))
+    elif settings.PUBLISH_MANIFESTS:
+        # no new images to wait for
+        publish_work_manifest(work.id, parser, worker.s3_client)
+
+    logging.info("Incrementally updated %s: %d removed, %d moved, %d added" % (
+        work.id, len(removed_ids), len(moved), len(added)))
+    return True
+
+
+def diff_work_images(previous_origins, image_ids, images):
+
+    # registered image ids are listed in number2 order, matching the stored origins by index
+    previous_indices = {}
+    for index, origin in enumerate(previous_origins):
+        previous_indices.setdefault(origin, []).append(index)
+
+    kept = set()
+    moved = []
+    added = []
+    for image in images:
+        indices = previous_indices.get(image.origin)
+        if indices:
+            index = indices.pop(0)
+            kept.add(index)
+            if index != image.number_2:
+                moved.append((image_ids[index], image.number_2))
+        else:
+            added.append(image)
+
+    removed_ids = [image_ids[index] for index in range(len(image_ids)) if index not in kept]
+    return removed_ids, moved, added
+
+
+def get_registered_image_ids(work, parser):
 
     manifest_url = parser.get_images_for_work_path(work.id)
-    response = get(manifest_url)
+    with metrics.timer('waylon_ingest_stage_seconds', stage='dlcs_list'):
+        response = get(manifest_url)
 
     if not response.status_code == 200:
-        logging.error("Could not get manifest to remove existing images")
-        return
+        logging.error("Could not get manifest of existing images")
+        return None
 
     result_string = response.text
     result = json.loads(result_string, object_pairs_hook=OrderedDict)
+    return [str(image_id) for image_id in result]
+
+
+def remove_existing_images(work, parser):
+
+    image_ids = get_registered_image_ids(work, parser)
+    if image_ids is None:
+        logging.error("Could not get manifest to remove existing images")
+        return
+    delete_images(image_ids)
+
+
+def delete_images(image_ids):
+
     images = []
-    for image_id in result:
-        images.append(dlcs.image_collection.Image(id=str(image_id)))
+    for image_id in image_ids:
+        images.append(dlcs.image_collection.Image(id=image_id))
     image_collection = dlcs.image_collection.ImageCollection(images)
-    collection_json = json.dumps(image_collection.to_json_dict())
     authorisation = auth.HTTPBasicAuth(settings.DLCS_API_KEY, settings.DLCS_API_SECRET)
-    delete_response = post(settings.DLCS_DELETE_PATH, data=collection_json, auth=authorisation)
+    with metrics.timer('waylon_ingest_stage_seconds', stage='dlcs_delete'):
+        delete_response = post(settings.DLCS_DELETE_PATH, data=dlcs.client.get_request_body(image_collection),
+                               auth=authorisation)
     if not delete_response.status_code == 200:
         logging.error("Error requesting existing image deletion")
         return
 
 
-def store_work_metadata(work):
+def get_work_metadata_data(work):
 
     data = {
         'meta': work.work_metadata,
@@ -131,19 +511,83 @@ def store_work_metadata(work):
     if len(work.flags) > 0:
         data['flags'] = work.flags
     if len(work.image_metadata) > 0:
-        data['image_metadata'] = work.image_metadata
-    json_data = json.dumps(data)
-    s3_client.put_object(Bucket=settings.META_S3, Key='work-' + work.id, Body=json_data)
+        if hasattr(work.image_metadata, 'to_json_dict'):
+            data['image_metadata'] = work.image_metadata.to_json_dict()
+        else:
+            data['image_metadata'] = work.image_metadata
+    # registered origins by number2, used to diff the next ingest of this work
+    data['images'] = [image.origin for image in work.image_collection.members]
+    return data
+
+
+def store_work_metadata(work, data=None):
+
+    if data is None:
+        data = get_work_metadata_data(work)
+    with metrics.timer('waylon_ingest_stage_seconds', stage='encode_metadata'):
+        body = encode_work_data(data, settings.WORK_METADATA_FORMAT)
+    with metrics.timer('waylon_ingest_stage_seconds', stage='s3_put'):
+        response = worker.s3_client.put_object(Bucket=settings.META_S3, Key='work-' + work.id, Body=body)
+    if metadata_index is not None:
+        metadata_index.put_work(work.id, response.get('ETag'), body)
+    # drop any decorated manifest the fuse service has cached for the previous version of this work
+    manifest_cache.remove_shared_entry(settings.MANIFEST_CACHE_PATH, work.id)
+    if settings.PUBLISH_MANIFESTS:
+        manifest_publishing.remove_published_manifest(worker.s3_client, work.id)
+
+
+def load_work_metadata(work_id):
+
+    try:
+        obj = worker.s3_client.get_object(Bucket=settings.META_S3, Key='work-' + work_id)
+    except worker.s3_client.exceptions.NoSuchKey:
+        return None
+    return decode_work_data(obj['Body'].read())
 
 
 def register_work_imagecollection(work):
 
-    dlcs.client.register_collection(work.image_collection)
+    register_images(work.id, work.image_collection)
+
+
+def register_images(work_id, image_collection):
+
+    with metrics.timer('waylon_ingest_stage_seconds', stage='dlcs_register'):
+        batches = dlcs.client.register_collection_in_batches(image_collection)
+    logging.debug("Registered %d images for work %s in %d batches" % (
+        image_collection.total_items, work_id, len(batches)))
+
+    if batch_tracker is None:
+        return
+    # the tracker thread has no worker state of its own, so bind this worker's parser, client and source record
+    callbacks = []
+    if settings.PUBLISH_MANIFESTS:
+        parser, s3_client = worker.parser, worker.s3_client
+        callbacks.append(lambda status: publish_work_manifest(work_id, parser, s3_client))
+    source_record = getattr(worker, 'source_record', None)
+    if source_record is not None:
+        source_record.add()
+        callbacks.append(source_record.release)
+
+    def on_complete(status):
+        for callback in callbacks:
+            callback(status)
+
+    batch_tracker.track(work_id, batches, on_complete=on_complete)
+
+
+def publish_work_manifest(work_id, parser, s3_client):
+
+    try:
+        with metrics.timer('waylon_ingest_stage_seconds', stage='publish'):
+            manifest_publishing.publish_manifest(s3_client, parser, work_id)
+    except Exception:
+        logging.exception("Could not publish manifest for work %s" % (work_id,))
 
 
 def get_file_details_from_message(message_body):
 
-    bucket_name, key = None, None
+    bucket_name, key, etag = None, None, None
     message = json.loads(message_body)
     records = message.get('Records')
     if records is not None and len(records) > 0:
@@ -155,7 +599,8 @@ def get_file_details_from_message(message_body):
             s3_object = s3.get('object')
             if s3_object is not None:
                 key = s3_object.get('key')
-    return bucket_name, key
+                etag = s3_object.get('eTag')
+    return bucket_name, key, etag
 
 
 def download_file(bucket, key):
@@ -164,13 +609,30 @@ def download_file(bucket, key):
     if not tmp_path.endswith('/'):
         tmp_path += '/'
     filename = tmp_path + 'waylon_' + str(uuid.uuid4())
-    s3_client.download_file(bucket, key, filename)
+    worker.s3_client.download_file(bucket, key, filename)
     return filename
 
 
-def send_error_message(message):
+def send_error_message(error_queue, message):
 
-    print str(message)
+    # route failures to the dead-letter queue if one is configured, otherwise to the local journal
+    if error_queue is not None:
+        try:
+            error_queue.send_message(MessageBody=message.body,
+                                     MessageAttributes={
+                                         'SourceMessageId': {'StringValue': message.message_id,
+                                                             'DataType': 'String'}})
+            return
+        except Exception:
+            logging.exception("Could not send message %s to error queue" % (message.message_id,))
+
+    entry = {
+        'time': time.time(),
+        'message_id': message.message_id,
+        'body': message.body,
+    }
+    with open(settings.FAILURE_JOURNAL_PATH, 'a') as journal:
+        journal.write(json.dumps(entry) + '\n')
 
 
 def get_input_queue():
@@ -180,5 +642,13 @@ def get_input_queue():
     return queue
 
 
+def get_error_queue():
+
+    if not settings.ERROR_QUEUE:
+        return None
+    sqs_client = boto3.resource('sqs', settings.SQS_REGION)
+    return sqs_client.get_queue_by_name(QueueName=settings.ERROR_QUEUE)
+
+
 if __name__ == "__main__":
     main()